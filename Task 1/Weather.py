@@ -1,281 +1,505 @@
+import argparse
+import os
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup, FeatureNotFound
 import re
+import threading
+from functools import partial
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
 from datetime import datetime, timedelta
 import time
 import json
-from urllib.parse import quote
+from urllib.parse import quote, unquote_plus
 
+from aggregation import METHODS, average_forecasts, find_coldest_day
+from forecast import MONTH_TO_ENGLISH, ForecastDay, DayResult, ForecastTable
+from http_cache import ResponseCache, CachingAdapter
+from metrics import Metrics, NULL_METRICS, profile_call
+from recording import RunRecorder, RunArchive, ReplayAdapter
+from resilience import FAILURE_THRESHOLD, CircuitOpen, Deadline, SourceHealth
+from sinks import FORMATS, open_sink, read_records, render_text_report, source_record, day_record
+from sources import SOURCE_SPECS, SOURCE_PLANS, TEMPERATURE_PATTERNS, decode_page, parse_temperature, format_url
+from wiki_api import WikiApiClient, api_url, page_title, extract_events
 
-class WeatherParser:
-    def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-            'Accept-Language': 'ru-RU,ru;q=0.8,en-US;q=0.5,en;q=0.3',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-        })
+SOURCE_URLS = {source: spec['url'] for source, spec in SOURCE_SPECS.items()}
 
-    def parse_yandex_weather(self):
-        try:
-            url = "https://yandex.ru/pogoda/moscow/details"
-            response = self.session.get(url, timeout=10)
-            soup = BeautifulSoup(response.content, 'html.parser')
+SOURCE_TITLES = {source: spec['title'] for source, spec in SOURCE_SPECS.items()}
 
-            days_data = []
+try:
+    import lxml
+    DEFAULT_PARSER_BACKEND = 'lxml'
+except ImportError:
+    DEFAULT_PARSER_BACKEND = 'html.parser'
 
-            forecast_items = soup.find_all('div', class_='forecast-briefly__day')
+FORECAST_CACHE_TTL = 3600
+WIKI_CACHE_TTL = 30 * 24 * 3600
 
-            for item in forecast_items[:7]:
-                try:
-                    date_elem = item.find('time', class_='forecast-briefly__date')
-                    date_text = date_elem.get_text(strip=True) if date_elem else "Неизвестно"
+WIKI_ERROR_EVENTS = ("Тестовое событие 1: В этот день в 1920 году произошло важное историческое событие. | "
+                     "Тестовое событие 2: Знаменательное событие случилось в 1945 году.")
 
-                    day_temp_elem = item.find('span', class_='temp__value_temp-max')
-                    day_temp = self.extract_temperature(day_temp_elem)
 
-                    night_temp_elem = item.find('span', class_='temp__value_temp-min')
-                    night_temp = self.extract_temperature(night_temp_elem)
+class NoForecastData(Exception):
+    pass
 
-                    if day_temp is not None and night_temp is not None:
-                        days_data.append({
-                            'date': date_text,
-                            'day_temp': day_temp,
-                            'night_temp': night_temp
-                        })
-                except Exception as e:
-                    continue
 
-            return days_data if days_data else self.get_test_data("Яндекс")
-        except Exception as e:
-            print(f"Ошибка парсинга Яндекс: {e}")
-            return self.get_test_data("Яндекс")
+class RateLimiter:
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
 
-    def parse_world_weather(self):
-        try:
-            url = "https://world-weather.ru/pogoda/russia/domodedovo/7days"
-            response = self.session.get(url, timeout=10)
-            soup = BeautifulSoup(response.content, 'html.parser')
+    def acquire(self):
+        if not self.rate:
+            return
 
-            days_data = []
-            day_containers = soup.find_all('div', class_='weather-short')
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
 
-            for container in day_containers[:7]:
-                try:
-                    date_elem = container.find('div', class_='dates short-d')
-                    date_text = date_elem.get_text(strip=True) if date_elem else "Неизвестно"
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
 
-                    day_temp_elem = container.select('tr.day td.weather-temperature span')
-                    day_temp = self.extract_temperature(day_temp_elem[0]) if day_temp_elem else None
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
 
-                    night_temp_elem = container.select('tr.night td.weather-temperature span')
-                    night_temp = self.extract_temperature(night_temp_elem[0]) if night_temp_elem else None
 
-                    if day_temp is not None and night_temp is not None:
-                        days_data.append({
-                            'date': date_text,
-                            'day_temp': day_temp,
-                            'night_temp': night_temp
-                        })
-                except Exception as e:
-                    continue
+class WeatherParser:
+    def __init__(self, urls=None, timeout=10, max_workers=4, pool_maxsize=4,
+                 wiki_url="https://ru.wikipedia.org/wiki", wiki_rps=1.0, wiki_burst=1,
+                 cache_dir=None, cache_max_bytes=50 * 1024 * 1024, events_index=None,
+                 parser_backend=DEFAULT_PARSER_BACKEND, use_strainers=True, extractor='stream', metrics=None,
+                 deadline=None, budgets=None, hedge=True, health_path=None, record_path=None, replay_path=None,
+                 wiki_api=False, breakers=True):
+        self.urls = dict(SOURCE_URLS)
+        if urls:
+            self.urls.update(urls)
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.wiki_url = wiki_url.rstrip('/')
+        self.wiki_limiter = RateLimiter(wiki_rps, wiki_burst)
+        self.wiki_api = wiki_api
+        self.events_index = events_index
+        self.parser_backend = parser_backend
+        self.use_strainers = use_strainers
+        self.extractor = extractor
+        self.metrics = metrics or NULL_METRICS
+        self.deadline = Deadline(deadline)
+        self.budgets = budgets or {}
+        self.hedge = hedge
+        # Без breakers предохранители не открываются: в пакетном режиме ошибки одного города
+        # не должны отключать сайт для всех остальных
+        self.health = SourceHealth(health_path, failure_threshold=FAILURE_THRESHOLD if breakers else None)
+        # Отдельный пул для самих запросов: поток сайта ждет ответа с ограничением по времени
+        # и при необходимости отправляет второй запрос, не дожидаясь первого. max_workers -
+        # число одновременных загрузок у вызывающего кода, пул вдвое больше на повторные запросы
+        self.fetch_executor = ThreadPoolExecutor(max_workers=max_workers * 2)
+
+        # Запись и воспроизведение запуска; часы берутся из архива, чтобы даты тестовых
+        # данных и сгенерированные даты событий совпадали при воспроизведении
+        self.recorder = None
+        if record_path:
+            self.recorder = RunRecorder(record_path, {'urls': self.urls, 'wiki_url': self.wiki_url,
+                                                      'wiki_api': self.wiki_api})
+        self.replay = RunArchive(replay_path) if replay_path else None
+        if self.replay:
+            self.urls.update(self.replay.settings.get('urls', {}))
+            self.wiki_url = self.replay.settings.get('wiki_url', self.wiki_url)
+            self.wiki_api = self.replay.settings.get('wiki_api', self.wiki_api)
+        self.wiki_client = WikiApiClient(api_url(self.wiki_url), self.fetch_wiki_api)
+        archive = self.replay or self.recorder
+        self.now = archive.now if archive else datetime.now
 
-            return days_data if days_data else self.get_test_data("World-Weather")
-        except Exception as e:
-            print(f"Ошибка парсинга World-Weather: {e}")
-            return self.get_test_data("World-Weather")
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(self.urls) + 1, pool_maxsize=pool_maxsize)
+
+        self.cache = None
+        if self.replay:
+            adapter = ReplayAdapter(self.replay)
+        elif cache_dir:
+            ttls = {url.split('{', 1)[0]: FORECAST_CACHE_TTL for url in self.urls.values()}
+            ttls[self.wiki_url] = WIKI_CACHE_TTL
+            ttls[self.wiki_client.url] = WIKI_CACHE_TTL
+            self.cache = ResponseCache(cache_dir, ttls, max_bytes=cache_max_bytes)
+            adapter = CachingAdapter(self.cache, adapter)
+
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+            'Accept-Language': 'ru-RU,ru;q=0.8,en-US;q=0.5,en;q=0.3',
+            'Accept-Encoding': 'gzip, deflate, br',
+            'Connection': 'keep-alive',
+            'Upgrade-Insecure-Requests': '1',
+        })
 
-    def parse_gismeteo(self):
+        self.sources = {source: partial(self.parse_source, source) for source in SOURCE_SPECS}
+
+    def fetch(self, url, timeout=None):
+        return self.session.get(url, timeout=timeout or self.timeout)
+
+    def close(self):
+        # Архив записи дописывает оглавление только при закрытии
+        if self.recorder:
+            self.recorder.close()
+        if self.replay:
+            self.replay.close()
+        # Не дожидаясь запросов, проигравших повторному: их ответы уже никому не нужны
+        self.fetch_executor.shutdown(wait=False)
+
+    def start_fetch(self, url, timeout):
+        # Запрос в пуле и событие его начала. Пока запрос ждет свободного потока, бюджет
+        # сайта не расходуется: отсчет идет с момента, когда запрос действительно начался
+        attempt = {'started': threading.Event(), 'at': None}
+
+        def run():
+            attempt['at'] = time.monotonic()
+            attempt['started'].set()
+            return self.fetch(url, timeout)
+
+        return self.fetch_executor.submit(run), attempt
+
+    def acquire_wiki_token(self, url):
+        # Токен ограничителя частоты нужен только запросу, который уйдет в сеть: свежий
+        # ответ из кэша его не ждет. Ожидание токена не входит в бюджет запроса.
+        if self.cache is not None and self.cache.has_fresh(url):
+            return
+        self.wiki_limiter.acquire()
+
+    def fetch_within_budget(self, source, url, hedge=True):
+        # Запрос должен уложиться в бюджет сайта и в общий срок запуска. Если ответа нет дольше
+        # p95 недавних ответов этого сайта, уходит второй такой же запрос, и берется тот ответ,
+        # что придет первым. Ответ 5xx одного из запросов не мешает дождаться другого.
+        self.health.check(source)
+        budget = min(self.budgets.get(source, self.timeout), self.deadline.remaining())
+        if budget <= 0:
+            self.metrics.count('deadline_exceeded', source)
+            raise TimeoutError("истек общий срок запуска")
+
+        hedge_after = self.health.p95(source) if hedge and self.hedge else None
+        future, attempt = self.start_fetch(url, budget)
+        remaining = self.deadline.remaining()
+        if not attempt['started'].wait(None if remaining == float('inf') else remaining):
+            future.cancel()
+            self.metrics.count('deadline_exceeded', source)
+            raise TimeoutError("истек общий срок запуска")
+        started = attempt['at']
+        budget = min(budget, self.deadline.remaining())
+        attempts = {future: attempt}
+        error = None
+        while attempts:
+            elapsed = time.monotonic() - started
+            timeout = budget - elapsed
+            if hedge_after is not None:
+                timeout = min(timeout, hedge_after - elapsed)
+            done, _ = wait(attempts, timeout=max(timeout, 0), return_when=FIRST_COMPLETED)
+
+            for future in done:
+                attempt = attempts.pop(future)
+                try:
+                    response = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                if response.status_code >= 500 and attempts:
+                    error = requests.HTTPError(f"{response.status_code} Server Error", response=response)
+                    continue
+                if not getattr(response, 'from_cache', False):
+                    self.health.observe_latency(source, time.monotonic() - attempt['at'])
+                if self.recorder:
+                    first = response.history[0] if response.history else response
+                    self.recorder.add(first.request.url, response)
+                return response
+
+            now = time.monotonic()
+            if now - started >= budget:
+                break
+            if hedge_after is not None and now - started >= hedge_after and attempts:
+                hedge_after = None
+                self.metrics.count('hedged_requests', source)
+                future, attempt = self.start_fetch(url, budget - (now - started))
+                attempts[future] = attempt
+            elif not attempts:
+                raise error
+
+        self.metrics.count('deadline_exceeded', source)
+        raise TimeoutError(f"нет ответа за {budget:.1f} с")
+
+    def make_soup(self, content, source=None):
+        parse_only = SOURCE_PLANS[source].soup_strainer if source and self.use_strainers else None
         try:
-            url = "https://www.gismeteo.ru/weather-moscow-4368/10-days/"
-            response = self.session.get(url, timeout=10)
-            soup = BeautifulSoup(response.content, 'html.parser')
-
-            days_data = []
-
-            day_containers = soup.find_all('div', class_='widget-row widget-row-days')
-
-            if day_containers:
-                dates_container = day_containers[0]
-                dates = dates_container.find_all('div', class_='row-item')
-
-                temp_containers = soup.find_all('div', class_='widget-row-chart widget-row-chart-temperature')
-
-                if temp_containers and len(dates) >= 7:
-                    day_temps = temp_containers[0].find_all('span', class_='unit unit_temperature_c')
-                    night_temps = temp_containers[1].find_all('span', class_='unit unit_temperature_c') if len(
-                        temp_containers) > 1 else []
-
-                    for i in range(min(7, len(dates))):
-                        try:
-                            date_text = dates[i].get_text(strip=True)
-
-                            day_temp = None
-                            night_temp = None
-
-                            if i * 2 < len(day_temps):
-                                day_temp = self.extract_temperature(day_temps[i * 2])
-                            if i * 2 < len(night_temps):
-                                night_temp = self.extract_temperature(night_temps[i * 2])
-
-                            if day_temp is not None and night_temp is not None:
-                                days_data.append({
-                                    'date': date_text,
-                                    'day_temp': day_temp,
-                                    'night_temp': night_temp
-                                })
-                        except Exception as e:
-                            continue
-
-            return days_data if days_data else self.get_test_data("Gismeteo")
+            return BeautifulSoup(content, self.parser_backend, parse_only=parse_only)
+        except FeatureNotFound:
+            return BeautifulSoup(content, 'html.parser', parse_only=parse_only)
+
+    def iter_sources_concurrently(self, sources=None):
+        sources = list(sources or self.sources)
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(sources))) as executor:
+            futures = {executor.submit(self.sources[source]): source for source in sources}
+            # При воспроизведении сайты выдаются в постоянном порядке, чтобы и вывод в консоль
+            # совпадал от запуска к запуску
+            for future in (futures if self.replay else as_completed(futures)):
+                yield futures[future], future.result()
+
+    def parse_all_sources(self, sources=None):
+        return dict(self.iter_sources_concurrently(sources))
+
+    def source_url(self, source, location=None):
+        return format_url(self.urls[source], location or SOURCE_SPECS[source]['location'])
+
+    def fetch_source(self, source, location=None):
+        # Загрузка и разбор прогноза сайта; при любой неудаче - исключение. Ошибки так же
+        # печатаются и считаются в метриках и предохранителе, как у parse_source.
+        name = SOURCE_SPECS[source]['name']
+        plan = SOURCE_PLANS[source]
+        metrics = self.metrics
+        stage = 'fetch'
+        try:
+            with metrics.timer('fetch', source):
+                response = self.fetch_within_budget(source, self.source_url(source, location))
+            response.raise_for_status()
+            metrics.count('bytes_downloaded', source, len(response.content))
+
+            stage = 'parse'
+            with metrics.timer('parse', source):
+                if self.extractor == 'soup':
+                    days_data = plan.extract_soup(self.make_soup(response.content, source))
+                else:
+                    days_data = plan.extract(page_text(response))
+        except CircuitOpen as e:
+            print(f"{name}: {e}")
+            metrics.count('circuit_open', source)
+            raise
         except Exception as e:
-            print(f"Ошибка парсинга Gismeteo: {e}")
-            return self.get_test_data("Gismeteo")
-
-    def parse_accuweather(self):
+            print(f"Ошибка парсинга {name}: {e}")
+            metrics.count('fetch_errors' if stage == 'fetch' else 'parse_failures', source)
+            self.record_failure(source)
+            raise
+
+        if not days_data:
+            metrics.count('parse_failures', source)
+            self.record_failure(source)
+            raise NoForecastData(f"{name}: на странице не найден прогноз")
+        self.health.record_success(source)
+        return days_data
+
+    def parse_source(self, source, location=None):
+        # Как fetch_source, но вместо исключения - тестовые данные с пометкой fallback
         try:
-            url = "https://www.accuweather.com/ru/ru/moscow/294021/daily-weather-forecast/294021"
-            response = self.session.get(url, timeout=10)
-            soup = BeautifulSoup(response.content, 'html.parser')
-
-            days_data = []
-
-            daily_containers = soup.find_all('div', class_='daily-wrapper')
+            return self.fetch_source(source, location)
+        except Exception:
+            self.metrics.count('fallbacks', source)
+            return self.get_test_data(SOURCE_SPECS[source]['name'])
 
-            for container in daily_containers[:7]:
-                try:
-                    date_elem = container.find('span', class_='module-header sub date')
-                    date_text = date_elem.get_text(strip=True) if date_elem else "Неизвестно"
+    def record_failure(self, source):
+        if self.health.record_failure(source):
+            name = SOURCE_SPECS[source]['name'] if source in SOURCE_SPECS else 'Википедия'
+            print(f"Сайт {name} не отвечает {self.health.failure_threshold} раза подряд, "
+                  f"следующая попытка через {self.health.cooldown:.0f} с")
 
-                    temp_elems = container.find_all('span', class_='high')
-                    day_temp = self.extract_temperature(temp_elems[0]) if temp_elems else None
+    def parse_yandex_weather(self):
+        return self.parse_source('yandex')
 
-                    low_temp_elems = container.find_all('span', class_='low')
-                    night_temp = self.extract_accu_night_temp(low_temp_elems[0]) if low_temp_elems else None
+    def parse_world_weather(self):
+        return self.parse_source('world_weather')
 
-                    if day_temp is not None and night_temp is not None:
-                        days_data.append({
-                            'date': date_text,
-                            'day_temp': day_temp,
-                            'night_temp': night_temp
-                        })
-                except Exception as e:
-                    continue
+    def parse_gismeteo(self):
+        return self.parse_source('gismeteo')
 
-            return days_data if days_data else self.get_test_data("AccuWeather")
-        except Exception as e:
-            print(f"Ошибка парсинга AccuWeather: {e}")
-            return self.get_test_data("AccuWeather")
+    def parse_accuweather(self):
+        return self.parse_source('accuweather')
 
     def get_test_data(self, source):
         test_data = []
         for i in range(7):
-            date = (datetime.now() + timedelta(days=i)).strftime("%d.%m")
-            test_data.append({
-                'date': f"{source} День {i + 1} ({date})",
-                'day_temp': 12 + i - 3,
-                'night_temp': 5 + i - 2
-            })
+            date = (self.now() + timedelta(days=i)).strftime("%d.%m")
+            test_data.append(ForecastDay(f"{source} День {i + 1} ({date})", 12 + i - 3, 5 + i - 2, fallback=True))
         return test_data
 
     def extract_temperature(self, element):
         if not element:
             return None
-
-        text = element.get_text(strip=True)
-        match = re.search(r'([+-]?\d+)', text)
-        if match:
-            return int(match.group(1))
-        return None
+        return parse_temperature(element.get_text(strip=True), TEMPERATURE_PATTERNS['temperature'])
 
     def extract_accu_night_temp(self, element):
         if not element:
             return None
-
-        text = element.get_text(strip=True)
-        match = re.search(r'/([+-]?\d+)', text)
-        if match:
-            return int(match.group(1))
-
-        match = re.search(r'([+-]?\d+)', text)
-        return int(match.group(1)) if match else None
+        return parse_temperature(element.get_text(strip=True), TEMPERATURE_PATTERNS['accu_night'])
+
+    def wikipedia_url(self, day, month_name):
+        english_month = MONTH_TO_ENGLISH.get(month_name.lower(), 'October')
+        return f"{self.wiki_url}/{english_month}_{day}"
+
+    def extract_wikipedia_events(self, content):
+        soup = self.make_soup(content)
+
+        events_text = []
+
+        events_header = soup.find(['h2', 'h3'], string=re.compile(r'События', re.IGNORECASE))
+
+        if events_header:
+            next_elem = events_header.find_next_sibling()
+            while next_elem and next_elem.name not in ['h2', 'h3']:
+                if next_elem.name == 'ul':
+                    for li in next_elem.find_all('li'):
+                        event_text = li.get_text(strip=True)
+                        if event_text and len(event_text) > 10:
+                            events_text.append(event_text)
+                elif next_elem.name == 'p':
+                    text = next_elem.get_text(strip=True)
+                    if text and len(text) > 20 and not text.startswith('['):
+                        events_text.append(text)
+
+                next_elem = next_elem.find_next_sibling()
+
+        if not events_text:
+            all_lists = soup.find_all('ul')
+            for ul in all_lists:
+                for li in ul.find_all('li'):
+                    text = li.get_text(strip=True)
+                    if (len(text) > 30 and
+                            re.search(r'\d{4}', text) and
+                            not re.search(r'\[\d+\]', text)):
+                        events_text.append(text)
+
+        return events_text
 
     def parse_wikipedia_events(self, day, month_name):
+        if self.events_index is not None:
+            entry = self.events_index.get(day, month_name)
+            if entry is not None:
+                return entry['events_text']
+
         try:
-            month_to_english = {
-                'января': 'January', 'февраля': 'February', 'марта': 'March',
-                'апреля': 'April', 'мая': 'May', 'июня': 'June',
-                'июля': 'July', 'августа': 'August', 'сентября': 'September',
-                'октября': 'October', 'ноября': 'November', 'декабря': 'December'
-            }
+            url = self.wikipedia_url(day, month_name)
 
-            english_month = month_to_english.get(month_name.lower(), 'October')
+            self.health.check('wikipedia')
+            self.acquire_wiki_token(url)
+            print(f"Запрос к Википедии: {url}")
 
-            url = f"https://ru.wikipedia.org/wiki/{english_month}_{day}"
+            with self.metrics.timer('fetch', 'wikipedia'):
+                response = self.fetch_within_budget('wikipedia', url, hedge=False)
+            response.raise_for_status()
+            self.metrics.count('bytes_downloaded', 'wikipedia', len(response.content))
+            with self.metrics.timer('parse', 'wikipedia'):
+                events_text = self.extract_wikipedia_events(response.content)
 
-            print(f"Запрос к Википедии: {url}")
+            return self.join_wikipedia_events(events_text, day, month_name)
+
+        except Exception as e:
+            self.wikipedia_error(e)
+            return WIKI_ERROR_EVENTS
+
+    def join_wikipedia_events(self, events_text, day, month_name):
+        if events_text:
+            self.health.record_success('wikipedia')
+        else:
+            self.metrics.count('parse_failures', 'wikipedia')
+            self.metrics.count('fallbacks', 'wikipedia')
+            self.record_failure('wikipedia')
+            month_to_russian = {
+                'января': 'января', 'февраля': 'февраля', 'марта': 'марта',
+                'апреля': 'апреля', 'мая': 'мая', 'июня': 'июня',
+                'июля': 'июля', 'августа': 'августа', 'сентября': 'сентября',
+                'октября': 'октября', 'ноября': 'ноября', 'декабря': 'декабря'
+            }
+            normalized_month = month_to_russian.get(month_name.lower(), 'октября')
+
+            test_events = [
+                f"{day} {normalized_month} {1900 + int(day)} года: Важное историческое событие произошло в этот день.",
+                f"В {1800 + int(day)} году {day} {normalized_month} случилось знаменательное событие в истории.",
+            ]
+            events_text = test_events[:2]
 
-            response = self.session.get(url, timeout=10)
-            soup = BeautifulSoup(response.content, 'html.parser')
-
-            events_text = []
-
-            events_header = soup.find(['h2', 'h3'], string=re.compile(r'События', re.IGNORECASE))
-
-            if events_header:
-                next_elem = events_header.find_next_sibling()
-                while next_elem and next_elem.name not in ['h2', 'h3']:
-                    if next_elem.name == 'ul':
-                        for li in next_elem.find_all('li'):
-                            event_text = li.get_text(strip=True)
-                            if event_text and len(event_text) > 10:
-                                events_text.append(event_text)
-                    elif next_elem.name == 'p':
-                        text = next_elem.get_text(strip=True)
-                        if text and len(text) > 20 and not text.startswith('['):
-                            events_text.append(text)
-
-                    next_elem = next_elem.find_next_sibling()
-
-            if not events_text:
-                all_lists = soup.find_all('ul')
-                for ul in all_lists:
-                    for li in ul.find_all('li'):
-                        text = li.get_text(strip=True)
-                        if (len(text) > 30 and
-                                re.search(r'\d{4}', text) and
-                                not re.search(r'\[\d+\]', text)):
-                            events_text.append(text)
-
-            if not events_text:
-                month_to_russian = {
-                    'января': 'января', 'февраля': 'февраля', 'марта': 'марта',
-                    'апреля': 'апреля', 'мая': 'мая', 'июня': 'июня',
-                    'июля': 'июля', 'августа': 'августа', 'сентября': 'сентября',
-                    'октября': 'октября', 'ноября': 'ноября', 'декабря': 'декабря'
-                }
-                normalized_month = month_to_russian.get(month_name.lower(), 'октября')
-
-                test_events = [
-                    f"{day} {normalized_month} {1900 + int(day)} года: Важное историческое событие произошло в этот день.",
-                    f"В {1800 + int(day)} году {day} {normalized_month} случилось знаменательное событие в истории.",
-                ]
-                events_text = test_events[:2]
-
-            return " | ".join(events_text[:3])
+        return " | ".join(events_text[:3])
+
+    def wikipedia_error(self, e, dates=1):
+        print(f"Ошибка парсинга Википедии: {e}")
+        if isinstance(e, CircuitOpen):
+            self.metrics.count('circuit_open', 'wikipedia')
+        else:
+            self.metrics.count('fetch_errors', 'wikipedia')
+            self.record_failure('wikipedia')
+        self.metrics.count('fallbacks', 'wikipedia', dates)
+
+    def fetch_wiki_api(self, url):
+        # Загрузка для WikiApiClient: те же предохранитель, ограничение частоты и бюджет,
+        # что у страниц Википедии
+        self.health.check('wikipedia')
+        self.acquire_wiki_token(url)
+        print(f"Запрос к API Википедии: {unquote_plus(url)}")
+
+        with self.metrics.timer('fetch', 'wikipedia'):
+            response = self.fetch_within_budget('wikipedia', url, hedge=False)
+        self.metrics.count('bytes_downloaded', 'wikipedia', len(response.content))
+        return response
+
+    def fetch_wikipedia_events_api(self, dates):
+        # Все даты без записи в индексе - одним запросом к API на каждые 50 дат
+        events = {}
+        titles = {}
+        for day, month in dates:
+            entry = self.events_index.get(day, month) if self.events_index is not None else None
+            if entry is not None:
+                events[(day, month)] = entry['events_text']
+            else:
+                month_title = month if month in MONTH_TO_ENGLISH else 'октября'
+                titles[(day, month)] = page_title(day, month_title)
+        if not titles:
+            return events
 
+        try:
+            pages = self.wiki_client.fetch_pages(titles.values())
         except Exception as e:
-            print(f"Ошибка парсинга Википедии: {e}")
-            return f"Тестовое событие 1: В этот день в 1920 году произошло важное историческое событие. | Тестовое событие 2: Знаменательное событие случилось в 1945 году."
+            self.wikipedia_error(e, len(titles))
+            for date in titles:
+                events[date] = WIKI_ERROR_EVENTS
+            return events
+
+        for (day, month), title in titles.items():
+            with self.metrics.timer('parse', 'wikipedia'):
+                events_text = extract_events(pages.get(title) or '')
+            events[(day, month)] = self.join_wikipedia_events(events_text, day, month)
+        return events
+
+    @staticmethod
+    def event_date_key(day, month_name):
+        return str(int(day)), month_name.lower()
+
+    def fetch_wikipedia_events(self, dates):
+        unique_dates = list(dict.fromkeys(self.event_date_key(day, month) for day, month in dates))
+        if not unique_dates:
+            return {}
+        if self.wiki_api:
+            return self.fetch_wikipedia_events_api(unique_dates)
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(unique_dates))) as executor:
+            futures = {executor.submit(self.parse_wikipedia_events, day, month): (day, month)
+                       for day, month in unique_dates}
+            return {futures[future]: future.result() for future in as_completed(futures)}
+
+
+WORD_PATTERN = re.compile(r'\b[а-яёa-z]+\b', re.IGNORECASE)
+SHIFT_TOKEN_PATTERN = re.compile(r'(\b[а-яё]+\b|\S+)', re.IGNORECASE)
+CYRILLIC_WORD_PATTERN = re.compile(r'^\b[а-яё]+\b$', re.IGNORECASE)
+ALPHABET = 'абвгдеёжзийклмнопрстуфхцчшщъыьэюяabcdefghijklmnopqrstuvwxyz'
+# Редкие символы, которые WORD_PATTERN с IGNORECASE тоже считает буквами (например, 'ſ')
+NON_ALPHABET_PATTERN = re.compile(f'[^ {ALPHABET}]')
+WORD_WITH_A_PATTERN = re.compile(r'[^ ]*а[^ ]*')
+WORD_WITH_O_PATTERN = re.compile(r'[^ ]*о[^ ]*')
 
 
 class TextProcessor:
     @staticmethod
     def count_words(text):
-        words = re.findall(r'\b[а-яёa-z]+\b', text, re.IGNORECASE)
+        words = WORD_PATTERN.findall(text)
         return len(words)
 
     @staticmethod
@@ -283,43 +507,286 @@ class TextProcessor:
         words_with_a = 0
         words_with_o = 0
 
-        words = re.findall(r'\b[а-яёa-z]+\b', text, re.IGNORECASE)
+        words = WORD_PATTERN.findall(text)
 
         for word in words:
-            if 'а' in word.lower():
+            lower = word.lower()
+            if 'а' in lower:
                 words_with_a += 1
-            if 'о' in word.lower():
+            if 'о' in lower:
                 words_with_o += 1
 
         return words_with_a, words_with_o
 
     @staticmethod
     def shift_words(text):
-        tokens = re.findall(r'(\b[а-яё]+\b|\S+)', text, re.IGNORECASE)
-        words_with_positions = []
+        return ' '.join(TextProcessor.shift_tokens(SHIFT_TOKEN_PATTERN.findall(text)))
+
+    @staticmethod
+    def token_shift(token):
+        if not CYRILLIC_WORD_PATTERN.match(token):
+            return 0
+        lower = token.lower()
+        if 'а' in lower:
+            return 1
+        if 'о' in lower:
+            return 3
+        return 0
+
+    @staticmethod
+    def shift_tokens(tokens, shifts=None):
+        # Слово с "а" переносится на 1 позицию назад, слово с "о" - на 3. Слова обрабатываются
+        # по порядку, и из списка каждый раз берется первое вхождение такого же слова.
+        # Сдвиги меняют только позиции не дальше текущего слова i, поэтому узел i всегда стоит
+        # на позиции i, а целевая позиция находится в 1-3 шагах назад от него. Список токенов
+        # хранится как двусвязный список, а вхождения каждого слова - как очередь узлов
+        # в порядке списка, поэтому каждый сдвиг занимает O(1).
+        count = len(tokens)
+        if count == 0:
+            return []
+
+        prev = list(range(-1, count - 1))
+        nxt = list(range(1, count + 1))
+        nxt[-1] = -1
+        head = 0
+        occurrences = {}
+        if shifts is None:
+            shifts = [TextProcessor.token_shift(token) for token in tokens]
 
         for i, token in enumerate(tokens):
-            if re.match(r'^\b[а-яё]+\b$', token, re.IGNORECASE):
-                if 'а' in token.lower():
-                    words_with_positions.append(('a', token, i))
-                elif 'о' in token.lower():
-                    words_with_positions.append(('o', token, i))
+            shift = shifts[i]
+            if not shift:
+                continue
+
+            queue = occurrences.get(token)
+            if queue is None:
+                queue = occurrences[token] = deque()
+            queue.append(i)
+
+            target = i
+            for _ in range(shift):
+                if prev[target] == -1:
+                    break
+                target = prev[target]
+
+            moved = queue.popleft()
+            if moved == target:
+                queue.appendleft(moved)
+                continue
+
+            after_target = True
+            node = target
+            while node != i:
+                node = nxt[node]
+                if node == moved:
+                    after_target = False
+                    break
+
+            before, after = prev[moved], nxt[moved]
+            if before != -1:
+                nxt[before] = after
+            else:
+                head = after
+            if after != -1:
+                prev[after] = before
+
+            if after_target:
+                after = nxt[target]
+                prev[moved], nxt[moved] = target, after
+                nxt[target] = moved
+                if after != -1:
+                    prev[after] = moved
+            else:
+                before = prev[target]
+                prev[moved], nxt[moved] = before, target
+                prev[target] = moved
+                if before != -1:
+                    nxt[before] = moved
+                else:
+                    head = moved
+
+            later = 0
+            node = moved
+            while node != i:
+                node = nxt[node]
+                if tokens[node] == token:
+                    later += 1
+
+            tail = [queue.pop() for _ in range(later)]
+            queue.append(moved)
+            queue.extend(reversed(tail))
+
+        result = []
+        node = head
+        while node != -1:
+            result.append(tokens[node])
+            node = nxt[node]
+        return result
+
+    @staticmethod
+    def shift_words_batch(texts, processes=None, chunksize=64):
+        if not processes or processes == 1:
+            return [TextProcessor.shift_words(text) for text in texts]
+
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            return list(executor.map(TextProcessor.shift_words, texts, chunksize=chunksize))
 
-        result_tokens = tokens.copy()
+    @staticmethod
+    def empty_stats():
+        return {'total_words': 0, 'words_with_a': 0, 'words_with_o': 0, 'letters': Counter()}
 
-        for letter_type, word, original_pos in words_with_positions:
-            if letter_type == 'a':
-                new_pos = max(0, original_pos - 1)
+    @staticmethod
+    def merge_stats(stats, other):
+        for key in ('total_words', 'words_with_a', 'words_with_o'):
+            stats[key] += other[key]
+        stats['letters'].update(other['letters'])
+        return stats
+
+    @staticmethod
+    def count_tokens(tokens, stats):
+        # Один проход по токенам сдвига: считает слова, буквы и заодно сдвиги для shift_tokens.
+        # Русское слово целиком является токеном, а в остальных токенах слова ищутся
+        # WORD_PATTERN - так получаются те же слова, что и при поиске по всему тексту.
+        total_words = words_with_a = words_with_o = 0
+        words = []
+        shifts = []
+
+        for token in tokens:
+            if CYRILLIC_WORD_PATTERN.match(token):
+                lower = token.lower()
+                found = (lower,)
+                shifts.append(1 if 'а' in lower else 3 if 'о' in lower else 0)
             else:
-                new_pos = max(0, original_pos - 3)
+                found = [word.lower() for word in WORD_PATTERN.findall(token)]
+                shifts.append(0)
+
+            for lower in found:
+                total_words += 1
+                if 'а' in lower:
+                    words_with_a += 1
+                if 'о' in lower:
+                    words_with_o += 1
+                words.append(lower)
+
+        stats['total_words'] += total_words
+        stats['words_with_a'] += words_with_a
+        stats['words_with_o'] += words_with_o
+        stats['letters'].update(''.join(words))
+        return shifts
+
+    @staticmethod
+    def count_words_stats(text, stats):
+        # Без сдвига токены сдвига не нужны: слова ищутся одним findall, приводятся к нижнему
+        # регистру одной строкой, а буквы и слова с 'а'/'о' считаются встроенными методами строки
+        words = WORD_PATTERN.findall(text)
+        joined = ' '.join(words).lower()
+
+        stats['total_words'] += len(words)
+        stats['words_with_a'] += len(WORD_WITH_A_PATTERN.findall(joined))
+        stats['words_with_o'] += len(WORD_WITH_O_PATTERN.findall(joined))
+        letters = stats['letters']
+        for letter in ALPHABET:
+            count = joined.count(letter)
+            if count:
+                letters[letter] += count
+        letters.update(NON_ALPHABET_PATTERN.findall(joined))
+        return stats
 
-            if original_pos < len(result_tokens) and result_tokens[original_pos] == word:
-                current_pos = result_tokens.index(word) if word in result_tokens[original_pos:original_pos + 1] else -1
-                if current_pos != -1:
-                    result_tokens.pop(current_pos)
-                    result_tokens.insert(new_pos, word)
+    @staticmethod
+    def analyze(text, shift=True, processes=None, chunk_size=1 << 20):
+        # Возвращает total_words, words_with_a, words_with_o, letters (Counter букв в словах)
+        # и, если shift=True, shifted_text. Большой текст при processes > 1 считается по частям
+        # в пуле процессов; сдвиг зависит от всего текста, поэтому он считается здесь же.
+        if processes and processes > 1 and len(text) > chunk_size:
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                parts = executor.map(partial(TextProcessor.analyze, shift=False), split_text(text, chunk_size))
+                shifted_text = TextProcessor.shift_words(text) if shift else None
+                stats = TextProcessor.empty_stats()
+                for part in parts:
+                    TextProcessor.merge_stats(stats, part)
+            if shift:
+                stats['shifted_text'] = shifted_text
+            return stats
+
+        stats = TextProcessor.empty_stats()
+        if not shift:
+            return TextProcessor.count_words_stats(text, stats)
+
+        tokens = SHIFT_TOKEN_PATTERN.findall(text)
+        shifts = TextProcessor.count_tokens(tokens, stats)
+        stats['shifted_text'] = ' '.join(TextProcessor.shift_tokens(tokens, shifts))
+        return stats
 
-        return ' '.join(result_tokens)
+    @staticmethod
+    def analyze_file(path, processes=None, chunk_size=1 << 20, encoding='utf-8'):
+        # Потоковый подсчет для файлов любого размера: в памяти только несколько кусков.
+        # Сдвинутый текст здесь не строится - слово может переехать из любого места текста,
+        # поэтому для сдвига нужен весь список токенов.
+        stats = TextProcessor.empty_stats()
+        with open(path, encoding=encoding) as f:
+            chunks = iter_text_chunks(f, chunk_size)
+            if not processes or processes == 1:
+                for chunk in chunks:
+                    TextProcessor.merge_stats(stats, TextProcessor.analyze(chunk, shift=False))
+                return stats
+
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                in_flight = set()
+                for chunk in chunks:
+                    if len(in_flight) >= processes * 2:
+                        done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            TextProcessor.merge_stats(stats, future.result())
+                    in_flight.add(executor.submit(TextProcessor.analyze, chunk, False))
+
+                for future in as_completed(in_flight):
+                    TextProcessor.merge_stats(stats, future.result())
+        return stats
+
+
+def split_text(text, chunk_size):
+    # Куски режутся после пробела или перевода строки, поэтому ни одно слово не разрывается
+    start = 0
+    while start < len(text):
+        end = start + chunk_size
+        if end < len(text):
+            cut = max(text.rfind(' ', start, end), text.rfind('\n', start, end))
+            if cut < start:
+                # Слово длиннее куска - кусок продлевается до ближайшего пробела
+                cut = min((i for i in (text.find(' ', end), text.find('\n', end)) if i != -1),
+                          default=len(text) - 1)
+            end = cut + 1
+        yield text[start:end]
+        start = end
+
+
+def iter_text_chunks(f, chunk_size):
+    rest = ''
+    while True:
+        data = f.read(chunk_size)
+        if not data:
+            break
+        data = rest + data
+        cut = max(data.rfind(' '), data.rfind('\n'))
+        if cut == -1:
+            rest = data
+            continue
+        rest = data[cut + 1:]
+        yield data[:cut + 1]
+    if rest:
+        yield rest
+
+
+def page_text(response):
+    # requests подставляет ISO-8859-1 для text/html без charset, поэтому кодировка из
+    # заголовка берется, только если сайт ее действительно объявил
+    content_type = response.headers.get('Content-Type', '').lower()
+    declared = response.encoding if 'charset' in content_type else None
+    return decode_page(response.content, declared, lambda: response.apparent_encoding)
+
+
+def is_fallback(data):
+    return bool(data) and data[0].fallback
 
 
 def print_weather_data(source_name, data):
@@ -331,96 +798,229 @@ def print_weather_data(source_name, data):
         print("Нет данных")
         return
 
+    if is_fallback(data):
+        print("ТЕСТОВЫЕ ДАННЫЕ: сайт недоступен, значения ниже не настоящие")
+
     for i, day_data in enumerate(data[:7]):
-        print(f"День {i + 1}: {day_data['date']}")
-        print(f"  Дневная температура: {day_data['day_temp']}°C")
-        print(f"  Ночная температура: {day_data['night_temp']}°C")
+        print(f"День {i + 1}: {day_data.date}")
+        print(f"  Дневная температура: {day_data.day_temp}°C")
+        print(f"  Ночная температура: {day_data.night_temp}°C")
         print("-" * 40)
 
 
-def main():
-    print("Загрузка...")
-    print("=" * 60)
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Парсинг прогноза погоды и анализ текста")
+    parser.add_argument('--cache-dir', default='.weather_cache',
+                        help="каталог дискового HTTP-кэша (по умолчанию .weather_cache)")
+    parser.add_argument('--no-cache', action='store_true', help="не использовать HTTP-кэш")
+    parser.add_argument('--cache-max-mb', type=int, default=50, help="максимальный размер кэша в МБ")
+    parser.add_argument('--method', choices=METHODS, default='mean',
+                        help="способ усреднения температур по сайтам (по умолчанию mean)")
+    parser.add_argument('--weights', default='',
+                        help="веса сайтов для --method weighted, например yandex=2,gismeteo=1")
+    parser.add_argument('--events-index', default='events_index.sqlite',
+                        help="индекс событий Википедии (используется, если файл существует)")
+    parser.add_argument('-o', '--output', default='weather_results.jsonl',
+                        help="файл записей с результатами (по умолчанию weather_results.jsonl)")
+    parser.add_argument('--format', choices=FORMATS,
+                        help="формат файла записей: jsonl, csv, parquet, arrow (по умолчанию по расширению)")
+    parser.add_argument('--report', default='weather_results.txt',
+                        help="текстовый отчет, который строится из файла записей (пустая строка - не строить)")
+    parser.add_argument('--history', help="файл истории прогнозов, в который дописываются прогнозы запуска")
+    parser.add_argument('--wiki-url', default="https://ru.wikipedia.org/wiki", help="адрес Википедии")
+    parser.add_argument('--wiki-rps', type=float, default=1.0, help="запросов к Википедии в секунду")
+    parser.add_argument('--wiki-api', action='store_true',
+                        help="брать события через MediaWiki API: вики-текст всех дат одним запросом")
+    parser.add_argument('--metrics', help="сохранить метрики запуска в формате Prometheus в этот файл")
+    parser.add_argument('--profile', help="записать профиль cProfile в этот файл (python -m pstats, snakeviz)")
+    parser.add_argument('--deadline', type=float, default=60,
+                        help="общий срок на все загрузки в секундах (по умолчанию 60)")
+    parser.add_argument('--budget', type=float, default=10,
+                        help="время на ответ одного сайта в секундах (по умолчанию 10)")
+    parser.add_argument('--budgets', default='',
+                        help="бюджеты отдельных сайтов, например yandex=3,wikipedia=5")
+    parser.add_argument('--no-hedge', action='store_true',
+                        help="не отправлять повторный запрос, когда сайт отвечает дольше своего p95")
+    parser.add_argument('--source-state',
+                        help="файл состояния предохранителей и времен ответа сайтов "
+                             "(по умолчанию source_state.json в каталоге кэша, пустая строка - не сохранять)")
+    replay = parser.add_mutually_exclusive_group()
+    replay.add_argument('--record', help="сохранить все принятые ответы сайтов в архив запуска (zip)")
+    replay.add_argument('--replay', help="взять ответы из архива запуска вместо сайтов")
+    args = parser.parse_args(argv)
+    try:
+        parse_weights(args.weights)
+        parse_budgets(args.budgets)
+    except ValueError as e:
+        parser.error(str(e))
+    return args
+
+
+def parse_source_values(text, sources, kind):
+    # "yandex=3,wikipedia=5" -> {'yandex': 3.0, 'wikipedia': 5.0}
+    values = {}
+    for item in filter(None, text.split(',')):
+        source, _, value = item.partition('=')
+        source = source.strip()
+        if source not in sources:
+            raise ValueError(f"Неизвестный сайт: {source}")
+        try:
+            values[source] = float(value)
+        except ValueError:
+            raise ValueError(f"Неверное значение {kind} для {source}: {value!r}") from None
+    return values
 
-    weather_parser = WeatherParser()
-    text_processor = TextProcessor()
 
-    print("Парсинг данных с сайтов...")
+def parse_budgets(text):
+    return parse_source_values(text, list(SOURCE_SPECS) + ['wikipedia'], 'бюджета')
 
-    yandex_data = weather_parser.parse_yandex_weather()
-    world_weather_data = weather_parser.parse_world_weather()
-    gismeteo_data = weather_parser.parse_gismeteo()
-    accuweather_data = weather_parser.parse_accuweather()
 
-    print_weather_data("Яндекс Погода", yandex_data)
-    print_weather_data("World-Weather", world_weather_data)
-    print_weather_data("Gismeteo", gismeteo_data)
-    print_weather_data("AccuWeather", accuweather_data)
+def parse_weights(text):
+    # "yandex=2,gismeteo=1" -> веса в порядке SOURCE_SPECS, у остальных сайтов вес 1
+    weights = parse_source_values(text, SOURCE_SPECS, 'веса')
+    return [weights.get(source, 1.0) for source in SOURCE_SPECS]
 
-    print(f"\nОбщая статистика:")
-    print(f"Яндекс - {len(yandex_data)} дней, World-Weather - {len(world_weather_data)} дней, "
-          f"Gismeteo - {len(gismeteo_data)} дней, AccuWeather - {len(accuweather_data)} дней")
 
-    all_data = [yandex_data, world_weather_data, gismeteo_data, accuweather_data]
+def main(argv=None):
+    args = parse_args(argv)
 
-    max_days = min(len(data) for data in all_data if data)
+    if args.profile:
+        try:
+            return profile_call(args.profile, run_main, args)
+        finally:
+            print(f"Профиль сохранен в файл '{args.profile}'")
+    return run_main(args)
 
-    if max_days == 0:
-        print("Не удается получить данные с сайтов")
-        return
 
-    average_temps = []
+def run_main(args):
+    print("Загрузка...")
+    print("=" * 60)
+
+    events_index = None
+    if args.events_index and os.path.exists(args.events_index):
+        from events_index import EventsIndex
+        events_index = EventsIndex(args.events_index)
+        print(f"Индекс событий: {args.events_index} ({len(events_index)} дат)")
+
+    health_path = args.source_state
+    if health_path is None and not args.no_cache:
+        health_path = os.path.join(args.cache_dir, 'source_state.json')
+    if args.replay:
+        # При воспроизведении сеть не нужна: ни кэша, ни предохранителей, ни ограничения частоты
+        health_path = None
+
+    weather_parser = WeatherParser(timeout=args.budget,
+                                   cache_dir=None if args.no_cache or args.replay else args.cache_dir,
+                                   cache_max_bytes=args.cache_max_mb * 1024 * 1024,
+                                   events_index=events_index,
+                                   wiki_url=args.wiki_url, wiki_rps=0 if args.replay else args.wiki_rps,
+                                   metrics=Metrics() if args.metrics else None,
+                                   deadline=args.deadline, budgets=parse_budgets(args.budgets),
+                                   hedge=not args.no_hedge, health_path=health_path or None,
+                                   record_path=args.record, replay_path=args.replay, wiki_api=args.wiki_api)
+    if args.replay:
+        print(f"Воспроизведение запуска от {weather_parser.now():%Y-%m-%d %H:%M:%S} "
+              f"из '{args.replay}' ({len(weather_parser.replay)} ответов)")
+    text_processor = TextProcessor()
 
-    for day_idx in range(max_days):
-        day_temps = []
-        night_temps = []
-        dates = []
+    print("Парсинг данных с сайтов...")
+
+    try:
+        with open_sink(args.output, args.format) as sink:
+            completed = run_forecast(args, weather_parser, text_processor, sink)
+    finally:
+        weather_parser.close()
+    weather_parser.health.save()
+    if args.record:
+        print(f"Ответы сайтов сохранены в архив '{args.record}' ({len(weather_parser.recorder.responses)} ответов)")
+
+    if completed and args.report:
+        with weather_parser.metrics.stage('report'), open(args.report, 'w', encoding='utf-8') as f:
+            render_text_report(read_records(args.output, args.format), f, SOURCE_TITLES)
+        print(f"\nРезультаты сохранены в файлы '{args.output}' и '{args.report}'")
+    elif completed:
+        print(f"\nРезультаты сохранены в файл '{args.output}'")
+
+    if weather_parser.cache:
+        stats = weather_parser.cache.stats()
+        print(f"HTTP-кэш: попаданий {stats['hits']}, промахов {stats['misses']}, "
+              f"ревалидаций {stats['revalidations']}, записей {stats['entries']}")
+    if args.metrics:
+        print(weather_parser.metrics.summary())
+        with open(args.metrics, 'w', encoding='utf-8') as f:
+            f.write(weather_parser.metrics.to_prometheus())
+        print(f"Метрики сохранены в файл '{args.metrics}'")
+    if completed:
+        print("Программа завершена успешно!")
+
+
+def run_forecast(args, weather_parser, text_processor, sink):
+    # Каждый сайт и каждый обработанный день сразу уходят в sink; в памяти остаются только
+    # прогнозы сайтов (по 7 дней) для вывода и их столбцы в ForecastTable для усреднения
+    source_data = {}
+    table = ForecastTable(SOURCE_SPECS)
+    # Записи сайтов уходят в sink в порядке SOURCE_SPECS, как только готовы все сайты перед
+    # ними: порядок готовности зависит от сети, а файл записей запуска и его воспроизведения
+    # должен совпадать
+    pending = list(SOURCE_SPECS)
+    with weather_parser.metrics.stage('sources'):
+        for source, data in weather_parser.iter_sources_concurrently():
+            print(f"Получены данные: {SOURCE_TITLES[source]} ({len(data)} дней)")
+            source_data[source] = data
+            table.extend(source, data)
+            while pending and pending[0] in source_data:
+                ready = pending.pop(0)
+                for index, day in enumerate(source_data[ready][:7]):
+                    sink.write(source_record(ready, index, day))
+
+    if args.history:
+        from history import ForecastHistory
+        with ForecastHistory(args.history) as history:
+            history.append_run(weather_parser.now().timestamp(), 'moscow', source_data)
+
+    for source in SOURCE_SPECS:
+        print_weather_data(SOURCE_TITLES[source], source_data[source])
 
-        for data in all_data:
-            if day_idx < len(data):
-                day_data = data[day_idx]
-                if day_data['day_temp'] is not None:
-                    day_temps.append(day_data['day_temp'])
-                if day_data['night_temp'] is not None:
-                    night_temps.append(day_data['night_temp'])
-                dates.append(day_data['date'])
+    print(f"\nОбщая статистика:")
+    print(", ".join(f"{spec['name']} - {len(source_data[source])} дней" for source, spec in SOURCE_SPECS.items()))
 
-        if day_temps and night_temps:
-            avg_day = sum(day_temps) / len(day_temps)
-            avg_night = sum(night_temps) / len(night_temps)
+    fallback_sources = [SOURCE_TITLES[source] for source in table.fallback_sources()]
+    if fallback_sources:
+        print(f"Тестовые данные вместо настоящих: {', '.join(fallback_sources)}")
 
-            display_date = next((d for d in dates if d != "Неизвестно"), dates[0] if dates else f"День {day_idx + 1}")
+    if not len(table):
+        print("Не удается получить данные с сайтов")
+        return False
 
-            average_temps.append({
-                'date': display_date,
-                'day_temp': round(avg_day, 1),
-                'night_temp': round(avg_night, 1),
-                'original_day_temp': avg_day
-            })
+    source_weights = parse_weights(args.weights)
+
+    metrics = weather_parser.metrics
+    with metrics.stage('aggregate'):
+        average_temps = average_forecasts(table, args.method, source_weights)
+        coldest_day_index = find_coldest_day(average_temps) if average_temps else None
 
     if not average_temps:
         print("Не удается вычислить средние температуры")
-        return
+        return False
 
-    coldest_day = min(average_temps, key=lambda x: x['original_day_temp'])
-    coldest_day_index = average_temps.index(coldest_day)
+    coldest_day = average_temps[coldest_day_index]
 
-    print(f"\nСамый холодный день: {coldest_day['date']} ({coldest_day['day_temp']}°C)")
+    print(f"\nСамый холодный день: {coldest_day.date} ({coldest_day.day_temp}°C)")
     print(f"Дней до самого холодного дня: {coldest_day_index}")
     print("=" * 60)
 
-    results = []
+    event_dates = []
 
     for i, day_data in enumerate(average_temps):
-        print(f"\nОбработка дня {i + 1}: {day_data['date']}")
+        print(f"\nОбработка дня {i + 1}: {day_data.date}")
 
-        date_match = re.search(r'(\d{1,2})\s*([а-яё]+)', day_data['date'].lower())
+        date_match = re.search(r'(\d{1,2})\s*([а-яё]+)', day_data.date.lower())
         if date_match:
             day_num = date_match.group(1)
             month_name = date_match.group(2)
             print(f"Извлеченная дата: {day_num} {month_name}")
         else:
-            future_date = datetime.now() + timedelta(days=i)
+            future_date = weather_parser.now() + timedelta(days=i)
             day_num = str(future_date.day)
             month_name = future_date.strftime("%B").lower()
             month_translation = {
@@ -432,30 +1032,39 @@ def main():
             month_name = month_translation.get(month_name, month_name)
             print(f"Сгенерированная дата: {day_num} {month_name}")
 
-        events_text = weather_parser.parse_wikipedia_events(day_num, month_name)
+        event_dates.append((day_num, month_name))
 
-        total_words = text_processor.count_words(events_text)
-        words_with_a, words_with_o = text_processor.count_words_with_letters(events_text)
-        shifted_text = text_processor.shift_words(events_text)
+    with metrics.stage('events'):
+        events_by_date = weather_parser.fetch_wikipedia_events(event_dates)
+
+    for i, day_data in enumerate(average_temps):
+        day_num, month_name = event_dates[i]
+        events_text = events_by_date[weather_parser.event_date_key(day_num, month_name)]
+
+        events_index = weather_parser.events_index
+        indexed = events_index.get(day_num, month_name) if events_index else None
+        if indexed is not None:
+            total_words = indexed['total_words']
+            words_with_a, words_with_o = indexed['words_with_a'], indexed['words_with_o']
+            shifted_text = indexed['shifted_text']
+        else:
+            with metrics.stage('text'):
+                stats = text_processor.analyze(events_text)
+            total_words = stats['total_words']
+            words_with_a, words_with_o = stats['words_with_a'], stats['words_with_o']
+            shifted_text = stats['shifted_text']
 
         days_until_coldest = abs(i - coldest_day_index)
 
-        result = {
-            'date': day_data['date'],
-            'day_temp': day_data['day_temp'],
-            'night_temp': day_data['night_temp'],
-            'days_until_coldest': days_until_coldest,
-            'total_words': total_words,
-            'words_with_a': words_with_a,
-            'words_with_o': words_with_o,
-            'original_text': events_text,
-            'shifted_text': shifted_text
-        }
-
-        results.append(result)
-
-        print(f"Дата: {day_data['date']}")
-        print(f"Средняя температура: днем {day_data['day_temp']}°C, ночью {day_data['night_temp']}°C")
+        result = DayResult(day_data.date, day_data.day_temp, day_data.night_temp, days_until_coldest,
+                           total_words, words_with_a, words_with_o, events_text, shifted_text,
+                           fallback=bool(fallback_sources))
+
+        sink.write(day_record(i, result))
+
+        print(f"Дата: {day_data.date}")
+        print(f"Средняя температура: днем {day_data.day_temp}°C, ночью {day_data.night_temp}°C"
+              + (" (с тестовыми данными)" if fallback_sources else ""))
         print(f"До самого холодного дня: {days_until_coldest} суток")
         print(f"Всего слов: {total_words}")
         print(f"Слов с 'а': {words_with_a}, с 'о': {words_with_o}")
@@ -463,48 +1072,7 @@ def main():
         print(f"Текст со сдвигом: {shifted_text}")
         print("-" * 80)
 
-        time.sleep(2)
-
-    with open('weather_results.txt', 'w', encoding='utf-8') as f:
-        f.write("РЕЗУЛЬТАТЫ\n")
-        f.write("=" * 80 + "\n\n")
-
-        f.write("ДАННЫЕ С ЯНДЕКС ПОГОДА:\n")
-        for i, day in enumerate(yandex_data[:7]):
-            f.write(f"День {i + 1}: {day['date']} - днем {day['day_temp']}°C, ночью {day['night_temp']}°C\n")
-        f.write("\n")
-
-        f.write("ДАННЫЕ С WORLD-WEATHER:\n")
-        for i, day in enumerate(world_weather_data[:7]):
-            f.write(f"День {i + 1}: {day['date']} - днем {day['day_temp']}°C, ночью {day['night_temp']}°C\n")
-        f.write("\n")
-
-        f.write("ДАННЫЕ С GISMETEO:\n")
-        for i, day in enumerate(gismeteo_data[:7]):
-            f.write(f"День {i + 1}: {day['date']} - днем {day['day_temp']}°C, ночью {day['night_temp']}°C\n")
-        f.write("\n")
-
-        f.write("ДАННЫЕ С ACCUWEATHER:\n")
-        for i, day in enumerate(accuweather_data[:7]):
-            f.write(f"День {i + 1}: {day['date']} - днем {day['day_temp']}°C, ночью {day['night_temp']}°C\n")
-        f.write("\n" + "=" * 80 + "\n\n")
-
-        f.write("ОБРАБОТАННЫЕ РЕЗУЛЬТАТЫ:\n")
-        f.write("=" * 80 + "\n\n")
-
-        for result in results:
-            f.write(f"Дата: {result['date']}\n")
-            f.write(f"Средняя температура: днем {result['day_temp']}°C, ночью {result['night_temp']}°C\n")
-            f.write(f"До самого холодного дня: {result['days_until_coldest']} суток\n")
-            f.write(f"Всего слов: {result['total_words']}\n")
-            f.write(f"Слов с буквой 'а': {result['words_with_a']}\n")
-            f.write(f"Слов с буквой 'о': {result['words_with_o']}\n")
-            f.write(f"Оригинальный текст: {result['original_text']}\n")
-            f.write(f"Текст со сдвигом: {result['shifted_text']}\n")
-            f.write("=" * 80 + "\n\n")
-
-    print(f"\nРезультаты сохранены в файл 'weather_results.txt'")
-    print("Программа завершена успешно!")
+    return True
 
 
 if __name__ == "__main__":
@@ -0,0 +1,157 @@
+import warnings
+
+import numpy as np
+
+from forecast import AverageDay, ForecastTable
+
+DAY, NIGHT = 0, 1
+
+METHODS = ('mean', 'median', 'trimmed', 'weighted')
+
+
+def to_array(all_data, days=None):
+    # Массив (источник x день x {день, ночь}); отсутствующие значения - NaN
+    if days is None:
+        days = max((len(data) for data in all_data), default=0)
+
+    temps = np.full((len(all_data), days, 2), np.nan)
+    for source_idx, data in enumerate(all_data):
+        values = [(np.nan if day.day_temp is None else day.day_temp,
+                   np.nan if day.night_temp is None else day.night_temp)
+                  for day in data[:days]]
+        if values:
+            temps[source_idx, :len(values)] = values
+    return temps
+
+
+def to_batch_array(cities_data, days=None):
+    # Массив (город x источник x день x {день, ночь}) для нескольких городов сразу;
+    # город - списки ForecastDay по сайтам или ForecastTable
+    tables = [all_data for all_data in cities_data if isinstance(all_data, ForecastTable)]
+    lists = [all_data for all_data in cities_data if not isinstance(all_data, ForecastTable)]
+    sources = max([len(table.sources) for table in tables] + [len(all_data) for all_data in lists], default=0)
+    if days is None:
+        days = max([table.day_count() for table in tables] + [len(data) for all_data in lists for data in all_data],
+                   default=0)
+
+    temps = np.full((len(cities_data), sources, days, 2), np.nan)
+    for city_idx, all_data in enumerate(cities_data):
+        if isinstance(all_data, ForecastTable):
+            temps[city_idx, :len(all_data.sources)] = all_data.temperature_array(days)
+        else:
+            temps[city_idx, :len(all_data)] = to_array(all_data, days)
+    return temps
+
+
+def nan_reduce(function, temps, **kwargs):
+    # Пустые срезы дают NaN, предупреждения об этом не нужны
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        return function(temps, **kwargs)
+
+
+def mean(temps):
+    return nan_reduce(np.nanmean, temps, axis=-3)
+
+
+def median(temps):
+    return nan_reduce(np.nanmedian, temps, axis=-3)
+
+
+def trimmed_mean(temps, proportion=0.25):
+    ordered = np.sort(temps, axis=-3)
+    counts = np.sum(~np.isnan(temps), axis=-3, keepdims=True)
+    cut = np.floor(counts * proportion)
+
+    ranks = np.arange(temps.shape[-3]).reshape((-1, 1, 1))
+    keep = (ranks >= cut) & (ranks < counts - cut)
+
+    total = np.sum(np.where(keep, ordered, 0.0), axis=-3)
+    kept = np.sum(keep, axis=-3)
+    return np.divide(total, kept, out=np.full(total.shape, np.nan), where=kept > 0)
+
+
+def weighted(temps, weights):
+    weights = np.asarray(weights, dtype=float).reshape((-1, 1, 1))
+    valid = ~np.isnan(temps)
+
+    total = np.sum(np.where(valid, temps, 0.0) * weights, axis=-3)
+    weight_sum = np.sum(np.where(valid, weights, 0.0), axis=-3)
+    return np.divide(total, weight_sum, out=np.full(total.shape, np.nan), where=weight_sum > 0)
+
+
+def consensus(temps, method='mean', weights=None, proportion=0.25):
+    if method == 'mean':
+        return mean(temps)
+    if method == 'median':
+        return median(temps)
+    if method == 'trimmed':
+        return trimmed_mean(temps, proportion)
+    if method == 'weighted':
+        if weights is None:
+            weights = np.ones(temps.shape[-3])
+        return weighted(temps, weights)
+    raise ValueError(f"Неизвестный способ усреднения: {method}")
+
+
+def coldest_days(day_temps):
+    # nanargmin по последней оси; для строк без данных возвращается -1
+    missing = np.all(np.isnan(day_temps), axis=-1)
+    if not day_temps.shape[-1]:
+        return np.full(missing.shape, -1)
+    filled = np.where(np.isnan(day_temps), np.inf, day_temps)
+    return np.where(missing, -1, np.argmin(filled, axis=-1))
+
+
+def average_forecasts(all_data, method='mean', weights=None):
+    # all_data - ForecastTable или списки ForecastDay по сайтам в порядке весов
+    table = all_data if isinstance(all_data, ForecastTable) else ForecastTable.from_days(all_data)
+    if not len(table):
+        return []
+
+    temps = table.temperature_array()
+    result = consensus(temps, method, weights)
+
+    average_temps = []
+    for day_idx, date in enumerate(table.display_dates(temps.shape[1])):
+        avg_day, avg_night = result[day_idx]
+        if np.isnan(avg_day) or np.isnan(avg_night):
+            continue
+
+        average_temps.append(AverageDay(date, round(float(avg_day), 1), round(float(avg_night), 1), float(avg_day)))
+
+    return average_temps
+
+
+def find_coldest_day(average_temps):
+    return int(np.nanargmin([day.original_day_temp for day in average_temps]))
+
+
+def aggregate_cities(cities_data, method='mean', weights=None):
+    # Усреднение сразу для многих городов: результат (город x день x {день, ночь}), маска дней,
+    # где известны обе температуры, и индекс самого холодного из них по оси дней (-1 - нет данных)
+    temps = to_batch_array(cities_data)
+    result = consensus(temps, method, weights)
+    valid = ~np.isnan(result).any(axis=-1)
+    return result, valid, coldest_days(np.where(valid, result[..., DAY], np.nan))
+
+
+def average_cities(cities_data, method='mean', weights=None):
+    # То же, что average_forecasts и find_coldest_day для каждого города, но одним
+    # вызовом aggregate_cities на все города; для каждого города - (дни AverageDay,
+    # номер самого холодного из них или None)
+    if not cities_data:
+        return []
+
+    tables = [all_data if isinstance(all_data, ForecastTable) else ForecastTable.from_days(all_data)
+              for all_data in cities_data]
+    result, valid, coldest = aggregate_cities(tables, method, weights)
+    averages = []
+    for city_idx, table in enumerate(tables):
+        dates = table.display_dates(result.shape[1])
+        average_temps = [AverageDay(dates[day_idx], round(float(avg_day), 1), round(float(avg_night), 1),
+                                    float(avg_day))
+                         for day_idx, (avg_day, avg_night) in enumerate(result[city_idx]) if valid[city_idx, day_idx]]
+        index = int(coldest[city_idx])
+        averages.append((average_temps, int(valid[city_idx, :index].sum()) if index >= 0 else None))
+    return averages
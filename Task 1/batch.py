@@ -0,0 +1,118 @@
+import argparse
+import csv
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from Weather import WeatherParser
+from aggregation import average_cities
+from sources import SOURCE_SPECS
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # В Linux ru_maxrss в килобайтах, в macOS - в байтах
+    return usage / 1024 if sys.platform != 'darwin' else usage / (1024 * 1024)
+
+
+def read_cities(f):
+    for row in csv.DictReader(f):
+        city = (row.get('city') or '').strip()
+        if not city:
+            continue
+        locations = {source: row[source].strip() for source in SOURCE_SPECS if (row.get(source) or '').strip()}
+        yield city, locations
+
+
+def fetch_city(weather_parser, city, locations):
+    source_data = {source: weather_parser.parse_source(source, location)
+                   for source, location in locations.items()}
+    return city, source_data
+
+
+def forecast_cities(fetched):
+    # Усреднение всех готовых городов одним вызовом average_cities вместо поочередного
+    averages = average_cities([list(source_data.values()) for _, source_data in fetched])
+    for (city, source_data), (average_temps, coldest_day) in zip(fetched, averages):
+        yield {
+            'city': city,
+            'sources': {source: [day.to_dict() for day in days] for source, days in source_data.items()},
+            'average': [day.to_dict() for day in average_temps],
+            'coldest_day': coldest_day,
+        }
+
+
+def run_batch(cities, out, weather_parser, workers=16, window=None, progress_every=0):
+    window = window or workers * 4
+    started = time.perf_counter()
+    written = 0
+
+    def write(done):
+        nonlocal written
+        for result in forecast_cities([future.result() for future in done]):
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            written += 1
+            if progress_every and written % progress_every == 0:
+                report_progress(written, time.perf_counter() - started)
+        out.flush()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        in_flight = set()
+        for city, locations in cities:
+            # Окно ограничивает число городов в работе, поэтому память не растет со списком
+            if len(in_flight) >= window:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                write(done)
+            in_flight.add(executor.submit(fetch_city, weather_parser, city, locations))
+
+        while in_flight:
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            write(done)
+
+    return written, time.perf_counter() - started
+
+
+def report_progress(written, elapsed):
+    rss = peak_rss_mb()
+    rss_text = f", пик памяти {rss:.1f} МБ" if rss is not None else ""
+    print(f"Городов: {written}, {written / elapsed:.1f} городов/с{rss_text}", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Прогноз погоды для списка городов")
+    parser.add_argument('cities', help="CSV-файл со столбцами city, " + ", ".join(SOURCE_SPECS))
+    parser.add_argument('-o', '--output', default='forecasts.jsonl', help="файл JSON Lines для результатов")
+    parser.add_argument('--workers', type=int, default=16, help="число одновременно обрабатываемых городов")
+    parser.add_argument('--window', type=int, help="максимум городов в работе (по умолчанию workers * 4)")
+    parser.add_argument('--timeout', type=float, default=10, help="таймаут запроса в секундах")
+    parser.add_argument('--cache-dir', help="каталог HTTP-кэша")
+    parser.add_argument('--progress-every', type=int, default=100, help="печатать скорость каждые N городов")
+    args = parser.parse_args(argv)
+
+    # Города обрабатываются в workers потоках, и каждый загружает свои сайты по очереди, поэтому
+    # одновременных загрузок не больше workers. Предохранители выключены: сайт, не нашедший
+    # один город, не должен пропускаться для остальных
+    weather_parser = WeatherParser(timeout=args.timeout, max_workers=args.workers, pool_maxsize=args.workers,
+                                   cache_dir=args.cache_dir, breakers=False)
+
+    try:
+        with open(args.cities, newline='', encoding='utf-8') as f, open(args.output, 'w', encoding='utf-8') as out:
+            written, elapsed = run_batch(read_cities(f), out, weather_parser, args.workers, args.window,
+                                         args.progress_every)
+    finally:
+        weather_parser.close()
+
+    report_progress(written, elapsed)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
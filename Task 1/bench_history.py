@@ -0,0 +1,145 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from forecast import ForecastDay
+from history import ForecastHistory, RECORD_DTYPE, DAY_SECONDS, OBSERVED, from_day, day_start
+from sources import SOURCE_SPECS
+
+START_DAY = 19724  # 2024-01-01
+
+
+def synthetic_runs(history, rows, cities, runs_per_day, days=8, seed=0):
+    # Запуски каждые 24 / runs_per_day часов; в каждом - прогнозы всех сайтов на days дней
+    # для всех городов и фактическая погода на день запуска
+    rng = np.random.default_rng(seed)
+    sources = [history.name_id('source', source) for source in SOURCE_SPECS]
+    observed = history.name_id('source', OBSERVED)
+    city_ids = np.array([history.name_id('city', f"city-{i}") for i in range(cities)], dtype=np.uint32)
+    bias = rng.normal(0, 1.5, len(sources))
+
+    per_run = cities * (len(sources) * days + 1)
+    runs = max(rows // per_run, 1)
+    truth = rng.normal(5, 8, (runs // runs_per_day + days + 1, cities))
+
+    leads = np.arange(days)
+    for run in range(runs):
+        run_time = day_start(START_DAY) + run * DAY_SECONDS // runs_per_day
+        run_day = run // runs_per_day
+        batch = np.empty(per_run, dtype=RECORD_DTYPE)
+        batch['run_time'] = run_time
+
+        forecasts = batch[:-cities].reshape(len(sources), cities, days)
+        forecasts['city'] = city_ids[None, :, None]
+        forecasts['target'] = START_DAY + run_day + leads
+        forecasts['source'] = np.array(sources, dtype=np.uint8)[:, None, None]
+        actual = truth[run_day + leads].T[None]
+        noise = rng.normal(0, 1, forecasts.shape) * (1 + leads * 0.5)
+        forecasts['day_temp'] = actual + bias[:, None, None] + noise
+        forecasts['night_temp'] = actual - 6 + bias[:, None, None] + noise
+
+        observations = batch[-cities:]
+        observations['city'] = city_ids
+        observations['target'] = START_DAY + run_day
+        observations['source'] = observed
+        observations['day_temp'] = truth[run_day]
+        observations['night_temp'] = truth[run_day] - 6
+        yield batch
+
+
+def timed(function, repeat=1):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return timings[len(timings) // 2], result
+
+
+def open_and_close(path):
+    with ForecastHistory(path) as history:
+        return len(history.records)
+
+
+def run(rows, cities, runs_per_day, directory):
+    path = os.path.join(directory, 'history.bin')
+    results = {'target_rows': rows, 'cities': cities}
+
+    with ForecastHistory(path) as history:
+        started = time.perf_counter()
+        for batch in synthetic_runs(history, rows, cities, runs_per_day):
+            history.append_array(batch)
+        elapsed = time.perf_counter() - started
+        results.update({
+            'rows': len(history),
+            'file_mb': os.path.getsize(path) / 2 ** 20,
+            'bytes_per_row': RECORD_DTYPE.itemsize,
+            'ingest_rows_per_s': len(history) / elapsed,
+        })
+
+        # Добавление одного запуска Weather.py через append_run (разбор дат в Python)
+        last_day = int(history.records['target'].max())
+        source_data = {source: [ForecastDay(from_day(last_day + i).strftime('%d.%m'), 5, 1) for i in range(7)]
+                       for source in SOURCE_SPECS}
+        run_time = day_start(last_day + 1)
+        seconds, written = timed(lambda: history.append_run(run_time, 'city-0', source_data))
+        results['append_run_rows_per_s'] = written / seconds
+
+    # Открытие и запросы - с чистого объекта, как при новом запуске
+    with ForecastHistory(path) as history:
+        results['open_ms'] = timed(lambda: open_and_close(path))[0] * 1000
+
+        days = int(history.records['target'][-1]) - START_DAY
+        rng = np.random.default_rng(1)
+        targets = [from_day(START_DAY + int(day)) for day in rng.integers(8, max(days - 1, 9), 50)]
+        seconds, found = timed(lambda: sum(len(history.forecasts_for(target)) for target in targets))
+        results['forecasts_for_ms'] = seconds / len(targets) * 1000
+        results['forecasts_for_rows'] = found / len(targets)
+
+        seconds, found = timed(lambda: sum(len(history.forecasts_for(target, 'city-7')) for target in targets))
+        results['forecasts_for_city_ms'] = seconds / len(targets) * 1000
+
+        month_start = day_start(START_DAY + days // 2)
+        seconds, stats = timed(lambda: history.error_stats(month_start, month_start + 30 * DAY_SECONDS), 3)
+        results['error_stats_30_days_ms'] = seconds * 1000
+        results['error_stats_30_days_rows'] = sum(row['count'] for row in stats)
+
+        seconds, stats = timed(lambda: history.error_stats())
+        results['error_stats_all_ms'] = seconds * 1000
+        results['error_stats_all_rows'] = sum(row['count'] for row in stats)
+
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Скорость записи и запросов к истории прогнозов")
+    parser.add_argument('--rows', type=int, default=5_000_000, help="примерное число записей")
+    parser.add_argument('--cities', type=int, default=100)
+    parser.add_argument('--runs-per-day', type=int, default=4)
+    parser.add_argument('--dir', help="каталог для файла истории (по умолчанию временный)")
+    parser.add_argument('--json', help="сохранить результаты в JSON-файл")
+    args = parser.parse_args(argv)
+
+    if args.dir:
+        results = run(args.rows, args.cities, args.runs_per_day, args.dir)
+    else:
+        with tempfile.TemporaryDirectory() as directory:
+            results = run(args.rows, args.cities, args.runs_per_day, directory)
+
+    for name, value in results.items():
+        print(f"{name:<28}{value:>14,.2f}" if isinstance(value, float) else f"{name:<28}{value:>14,}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+from Weather import WeatherParser, DEFAULT_PARSER_BACKEND
+from stub_server import FIXTURES_DIR, SOURCE_FIXTURES, WIKIPEDIA_FIXTURE, WIKITEXT_FIXTURE, api_query
+from wiki_api import WikiApiClient, extract_events
+
+WIKI_TITLE = '13 октября'
+
+
+class FixtureResponse:
+    def __init__(self, content):
+        self.content = content
+        self.status_code = 200
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return json.loads(self.content)
+
+
+def available_backends():
+    backends = ['html.parser']
+    if DEFAULT_PARSER_BACKEND == 'lxml':
+        backends.append('lxml')
+    return backends
+
+
+def load_fixture(filename):
+    with open(os.path.join(FIXTURES_DIR, filename), 'rb') as f:
+        return f.read()
+
+
+def wikipedia_api_response():
+    # Ответ MediaWiki API с вики-текстом той же статьи, что и в wikipedia.html
+    wikitext = load_fixture(WIKITEXT_FIXTURE).decode('utf-8')
+    return api_query({WIKI_TITLE: wikitext}, f"action=query&prop=revisions&titles={WIKI_TITLE}", len(wikitext))
+
+
+def wikipedia_api_job(content):
+    client = WikiApiClient('', lambda url: FixtureResponse(content))
+    return lambda parser: extract_events(client.fetch_pages([WIKI_TITLE])[WIKI_TITLE])
+
+
+def source_jobs():
+    for source, filename in SOURCE_FIXTURES.items():
+        content = load_fixture(filename)
+        yield source, content, lambda parser, source=source: parser.sources[source]()
+
+    content = load_fixture(WIKIPEDIA_FIXTURE)
+    yield 'wikipedia', content, lambda parser, content=content: parser.extract_wikipedia_events(content)
+
+    content = wikipedia_api_response()
+    yield 'wikipedia_api', content, wikipedia_api_job(content)
+
+
+def measure(job, parser, repeat):
+    job(parser)
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = job(parser)
+        timings.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    job(parser)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    timings.sort()
+    return {
+        'median_ms': timings[len(timings) // 2] * 1000,
+        'min_ms': timings[0] * 1000,
+        'peak_kb': peak / 1024,
+        'items': len(result),
+    }
+
+
+def configurations(source):
+    if source == 'wikipedia_api':
+        # Вики-текст разбирается регулярными выражениями, HTML-парсер не нужен
+        yield 'wikitext', False, {}
+        return
+    if source != 'wikipedia':
+        yield 'stream', False, {'extractor': 'stream'}
+    for backend in available_backends():
+        yield backend, False, {'extractor': 'soup', 'parser_backend': backend, 'use_strainers': False}
+        if source != 'wikipedia':
+            yield backend, True, {'extractor': 'soup', 'parser_backend': backend, 'use_strainers': True}
+
+
+def run(repeat=20):
+    results = []
+    for source, content, job in source_jobs():
+        for backend, use_strainers, options in configurations(source):
+            parser = WeatherParser(**options)
+            parser.fetch = lambda url, timeout=None, content=content: FixtureResponse(content)
+
+            stats = measure(job, parser, repeat)
+            stats.update({
+                'source': source,
+                'backend': backend,
+                'strainer': use_strainers,
+                'page_kb': len(content) / 1024,
+            })
+            results.append(stats)
+    return results
+
+
+def print_table(results):
+    print(f"{'Источник':<14}{'Парсер':<13}{'Strainer':<10}{'Страница, КБ':>14}{'Медиана, мс':>14}"
+          f"{'Пик памяти, КБ':>17}{'Дней':>6}")
+    print("-" * 88)
+    for row in results:
+        print(f"{row['source']:<14}{row['backend']:<13}{'да' if row['strainer'] else 'нет':<10}"
+              f"{row['page_kb']:>14.1f}{row['median_ms']:>14.2f}{row['peak_kb']:>17.1f}{row['items']:>6}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Сравнение скорости и памяти парсеров на сохраненных страницах")
+    parser.add_argument('--repeat', type=int, default=20, help="число повторов для каждой комбинации")
+    parser.add_argument('--json', help="сохранить результаты в JSON-файл")
+    args = parser.parse_args(argv)
+
+    results = run(args.repeat)
+    print_table(results)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+import argparse
+import gc
+import json
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from forecast import ForecastDay, ForecastTable
+
+MONTHS = ['января', 'февраля', 'марта', 'апреля', 'мая', 'июня', 'июля',
+          'августа', 'сентября', 'октября', 'ноября', 'декабря']
+
+
+def date_text(i):
+    # Новая строка на каждый день, как у парсеров: даты одинаковые по смыслу, но разные объекты
+    return ' '.join((str(i % 28 + 1), MONTHS[i // 28 % 12]))
+
+
+def build_dicts(count):
+    return [{'date': date_text(i), 'day_temp': i % 40 - 10, 'night_temp': i % 30 - 15} for i in range(count)]
+
+
+def build_days(count):
+    return [ForecastDay(date_text(i), i % 40 - 10, i % 30 - 15) for i in range(count)]
+
+
+def build_table(count, sources=4, days=7):
+    table = ForecastTable(range(sources))
+    for i in range(count):
+        table.append(i // days % sources, i % days, ForecastDay(date_text(i), i % 40 - 10, i % 30 - 15))
+    return table
+
+
+def measure(build, count):
+    # Память, которую занимает результат build (tracemalloc), и время построения
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = build(count)
+    elapsed = time.perf_counter() - started
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size, elapsed
+
+
+def timed(function):
+    started = time.perf_counter()
+    value = function()
+    return time.perf_counter() - started, value
+
+
+def run(count):
+    scale = 1_000_000 / count
+    results = {'days': count}
+
+    dicts, size, elapsed = measure(build_dicts, count)
+    results['dict_mb_per_million'] = size * scale / 2 ** 20
+    results['dict_build_s'] = elapsed
+    seconds, total = timed(lambda: sum(day['day_temp'] for day in dicts))
+    results['dict_sum_ms'] = seconds * 1000
+    del dicts
+
+    days, size, elapsed = measure(build_days, count)
+    results['slots_mb_per_million'] = size * scale / 2 ** 20
+    results['slots_build_s'] = elapsed
+    seconds, slots_total = timed(lambda: sum(day.day_temp for day in days))
+    results['slots_sum_ms'] = seconds * 1000
+    assert slots_total == total
+    del days
+
+    table, size, elapsed = measure(build_table, count)
+    results['table_mb_per_million'] = size * scale / 2 ** 20
+    results['table_column_mb_per_million'] = table.nbytes() * scale / 2 ** 20
+    results['table_build_s'] = elapsed
+    seconds, table_total = timed(lambda: float(np.frombuffer(table.day_temp, dtype=np.float32).sum(dtype=np.float64)))
+    results['table_sum_ms'] = seconds * 1000
+    assert table_total == total
+    seconds, _ = timed(table.temperature_array)
+    results['table_temperature_array_ms'] = seconds * 1000
+
+    results['saving_slots_mb_per_million'] = results['dict_mb_per_million'] - results['slots_mb_per_million']
+    results['saving_table_mb_per_million'] = results['dict_mb_per_million'] - results['table_mb_per_million']
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Память и скорость словарей, ForecastDay и ForecastTable")
+    parser.add_argument('--days', type=int, default=1_000_000, help="число дней прогноза")
+    parser.add_argument('--json', help="сохранить результаты в JSON-файл")
+    args = parser.parse_args(argv)
+
+    results = run(args.days)
+    for name, value in results.items():
+        print(f"{name:<32}{value:>14,.2f}" if isinstance(value, float) else f"{name:<32}{value:>14,}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
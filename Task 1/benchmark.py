@@ -0,0 +1,276 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from unittest import mock
+
+import Weather
+from Weather import WeatherParser, TextProcessor, DEFAULT_PARSER_BACKEND
+from bench_parsers import FixtureResponse, load_fixture, measure, wikipedia_api_job, wikipedia_api_response
+from metrics import Metrics
+from stub_server import StubServer, SOURCE_FIXTURES, WIKIPEDIA_FIXTURE
+
+PARSE_METHODS = {
+    'yandex': 'parse_yandex_weather',
+    'world_weather': 'parse_world_weather',
+    'gismeteo': 'parse_gismeteo',
+    'accuweather': 'parse_accuweather',
+}
+
+# Сценарии полного запуска: задержка ответа, случайная добавка к ней и доля ответов 503
+E2E_SCENARIOS = {
+    'fast': {'delay': 0.0, 'jitter': 0.0, 'error_rate': 0.0},
+    'latency': {'delay': 0.1, 'jitter': 0.1, 'error_rate': 0.0},
+    'errors': {'delay': 0.0, 'jitter': 0.0, 'error_rate': 0.3},
+    # Как latency, но события всех дат - одним запросом к MediaWiki API
+    'latency_wiki_api': {'delay': 0.1, 'jitter': 0.1, 'error_rate': 0.0, 'wiki_api': True},
+}
+
+
+def fixture_parser(content, **options):
+    parser = WeatherParser(metrics=Metrics(), **options)
+    parser.fetch = lambda url, timeout=None: FixtureResponse(content)
+    return parser
+
+
+def fallbacks(parser):
+    return sum(value for (name, _), value in parser.metrics.counters.items() if name == 'fallbacks')
+
+
+def bench_parse(repeat):
+    # Каждый parse_* на сохраненной странице; если парсер сломан и подставил тестовые
+    # данные, это видно по счетчику fallbacks
+    results = []
+    configurations = [('stream', {'extractor': 'stream'}),
+                      (f"soup-{DEFAULT_PARSER_BACKEND}", {'extractor': 'soup'})]
+    for source, method in PARSE_METHODS.items():
+        content = load_fixture(SOURCE_FIXTURES[source])
+        for name, options in configurations:
+            parser = fixture_parser(content, **options)
+            stats = measure(lambda parser: getattr(parser, method)(), parser, repeat)
+            stats.update({'group': 'parse', 'name': f"{method} [{name}]", 'fallbacks': fallbacks(parser)})
+            results.append(stats)
+
+    content = load_fixture(WIKIPEDIA_FIXTURE)
+    parser = fixture_parser(content)
+    stats = measure(lambda parser: parser.extract_wikipedia_events(content), parser, repeat)
+    stats.update({'group': 'parse', 'name': 'extract_wikipedia_events', 'fallbacks': 0 if stats['items'] else 1})
+    results.append(stats)
+
+    stats = measure(wikipedia_api_job(wikipedia_api_response()), None, repeat)
+    stats.update({'group': 'parse', 'name': 'extract_events [wikitext api]', 'fallbacks': 0 if stats['items'] else 1})
+    results.append(stats)
+    return results
+
+
+def bench_temperature(repeat):
+    results = []
+    jobs = [('extract_temperature', 'yandex', 'span.temp__value_temp-max'),
+            ('extract_accu_night_temp', 'accuweather', 'span.low')]
+    for method, source, selector in jobs:
+        parser = WeatherParser()
+        elements = parser.make_soup(load_fixture(SOURCE_FIXTURES[source])).select(selector)
+        function = getattr(parser, method)
+        stats = measure(lambda parser: [function(element) for element in elements], parser, repeat)
+        stats.update({'group': 'temperature', 'name': method, 'us_per_call': stats['median_ms'] * 1000 / len(elements)})
+        results.append(stats)
+    return results
+
+
+def bench_text(repeat, scale):
+    events = WeatherParser().extract_wikipedia_events(load_fixture(WIKIPEDIA_FIXTURE))
+    text = " | ".join(events[:3])
+    corpus = " | ".join(events) * scale
+
+    jobs = [
+        ('count_words', lambda _: TextProcessor.count_words(corpus)),
+        ('count_words_with_letters', lambda _: TextProcessor.count_words_with_letters(corpus)),
+        ('shift_words', lambda _: TextProcessor.shift_words(corpus)),
+        ('analyze', lambda _: TextProcessor.analyze(corpus)),
+        ('analyze[shift=False]', lambda _: TextProcessor.analyze(corpus, shift=False)),
+        ('shift_words_batch', lambda _: TextProcessor.shift_words_batch([text] * 200)),
+        ('analyze[events text]', lambda _: TextProcessor.analyze(text)),
+    ]
+
+    results = []
+    size_mb = len(corpus.encode('utf-8')) / 2 ** 20
+    for name, job in jobs:
+        stats = measure(lambda parser: [job(parser)], None, repeat)
+        stats.update({'group': 'text', 'name': name})
+        if name != 'shift_words_batch' and 'events text' not in name:
+            stats['mb_per_s'] = size_mb / (stats['median_ms'] / 1000)
+        results.append(stats)
+
+    with tempfile.NamedTemporaryFile('w', encoding='utf-8', suffix='.txt', delete=False) as f:
+        for _ in range(10):
+            f.write(corpus + "\n")
+    try:
+        stats = measure(lambda parser: [TextProcessor.analyze_file(f.name)], None, max(repeat // 4, 1))
+        stats.update({'group': 'text', 'name': 'analyze_file', 'mb_per_s': size_mb * 10 / (stats['median_ms'] / 1000)})
+        results.append(stats)
+    finally:
+        os.unlink(f.name)
+    return results
+
+
+def prometheus_total(path, metric):
+    total = 0
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.startswith(metric + '{'):
+                total += float(line.rsplit(' ', 1)[1])
+    return int(total)
+
+
+def run_end_to_end(server, directory, wiki_api=False):
+    argv = ['--no-cache', '--events-index', '', '--wiki-url', f"{server.base_url}/wiki", '--wiki-rps', '0',
+            '-o', os.path.join(directory, 'results.jsonl'), '--report', os.path.join(directory, 'results.txt'),
+            '--metrics', os.path.join(directory, 'metrics.prom')] + (['--wiki-api'] if wiki_api else [])
+    with mock.patch.dict(Weather.SOURCE_URLS, server.source_urls()), contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        Weather.main(argv)
+        elapsed = time.perf_counter() - started
+    return elapsed, prometheus_total(os.path.join(directory, 'metrics.prom'), 'weather_fallbacks_total')
+
+
+def bench_end_to_end(repeat):
+    results = []
+    for name, scenario in E2E_SCENARIOS.items():
+        timings = []
+        fallback_counts = []
+        with StubServer() as server, tempfile.TemporaryDirectory() as directory:
+            server.set_faults(error_rate=scenario['error_rate'], jitter=scenario['jitter'], seed=0)
+            server.add_weather_sources(scenario['delay'])
+            server.add_wikipedia_pages(scenario['delay'])
+            server.add_wikipedia_api(scenario['delay'])
+            for _ in range(repeat):
+                elapsed, fallback_count = run_end_to_end(server, directory, scenario.get('wiki_api', False))
+                timings.append(elapsed)
+                fallback_counts.append(fallback_count)
+            requests_made = server.httpd.request_count
+
+        timings.sort()
+        results.append({
+            'group': 'e2e',
+            'name': name,
+            'median_ms': timings[len(timings) // 2] * 1000,
+            'min_ms': timings[0] * 1000,
+            'fallbacks': max(fallback_counts),
+            'requests': requests_made // repeat,
+            **scenario,
+        })
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(groups, repeat, e2e_repeat, text_scale):
+    results = []
+    if 'parse' in groups:
+        results += bench_parse(repeat)
+    if 'temperature' in groups:
+        results += bench_temperature(repeat)
+    if 'text' in groups:
+        results += bench_text(repeat, text_scale)
+    if 'e2e' in groups:
+        results += bench_end_to_end(e2e_repeat)
+
+    return {
+        'meta': {
+            'commit': git_commit(),
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'parser_backend': DEFAULT_PARSER_BACKEND,
+            'repeat': repeat,
+        },
+        'results': results,
+    }
+
+
+def key(row):
+    return f"{row['group']}/{row['name']}"
+
+
+def print_table(report, baseline=None):
+    previous = {key(row): row for row in baseline['results']} if baseline else {}
+    if baseline:
+        print(f"Сравнение с {baseline['meta'].get('commit')} ({baseline['meta'].get('date')})")
+
+    print(f"{'Тест':<48}{'Медиана, мс':>13}{'Мин, мс':>11}{'Было, мс':>11}{'Изменение':>11}  Примечание")
+    print("-" * 110)
+    for row in report['results']:
+        old = previous.get(key(row))
+        old_text = f"{old['median_ms']:>11.2f}" if old else f"{'':>11}"
+        change = f"{(row['median_ms'] / old['median_ms'] - 1) * 100:>+10.1f}%" if old else f"{'':>11}"
+        notes = []
+        if row.get('fallbacks'):
+            notes.append(f"тестовые данные: {row['fallbacks']}")
+        if 'mb_per_s' in row:
+            notes.append(f"{row['mb_per_s']:.1f} МБ/с")
+        if 'us_per_call' in row:
+            notes.append(f"{row['us_per_call']:.1f} мкс/вызов")
+        print(f"{key(row):<48}{row['median_ms']:>13.2f}{row['min_ms']:>11.2f}{old_text}{change}  {', '.join(notes)}")
+
+
+def regressions(report, baseline, threshold):
+    previous = {key(row): row for row in baseline['results']}
+    return [key(row) for row in report['results']
+            if key(row) in previous and row['median_ms'] > previous[key(row)]['median_ms'] * (1 + threshold / 100)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Воспроизводимые замеры на сохраненных страницах и тестовом сервере")
+    parser.add_argument('--groups', default='parse,temperature,text,e2e',
+                        help="какие группы запускать (по умолчанию parse,temperature,text,e2e)")
+    parser.add_argument('--repeat', type=int, default=20, help="повторов для микротестов")
+    parser.add_argument('--e2e-repeat', type=int, default=3, help="повторов полного запуска")
+    parser.add_argument('--text-scale', type=int, default=20, help="во сколько раз умножить текст событий")
+    parser.add_argument('--json', help="сохранить результаты в JSON-файл")
+    parser.add_argument('--compare', help="JSON-файл прошлого запуска для сравнения")
+    parser.add_argument('--max-regression', type=float,
+                        help="завершиться с ошибкой, если тест медленнее прошлого запуска больше чем на N процентов")
+    parser.add_argument('--strict', action='store_true',
+                        help="завершиться с ошибкой, если парсер сохраненной страницы подставил тестовые данные")
+    args = parser.parse_args(argv)
+
+    report = run(set(args.groups.split(',')), args.repeat, args.e2e_repeat, args.text_scale)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_table(report, baseline)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    status = 0
+    broken = [key(row) for row in report['results'] if row['group'] == 'parse' and row.get('fallbacks')]
+    if broken:
+        print("Парсеры вернули тестовые данные: " + ", ".join(broken), file=sys.stderr)
+        status = 1 if args.strict else status
+    if baseline and args.max_regression is not None:
+        slower = regressions(report, baseline, args.max_regression)
+        if slower:
+            print(f"Медленнее более чем на {args.max_regression}%: " + ", ".join(slower), file=sys.stderr)
+            status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,239 @@
+import argparse
+import os
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, timedelta
+
+from Weather import WeatherParser, TextProcessor, MONTH_TO_ENGLISH
+from wiki_api import MAX_TITLES, WikiApiClient, api_url, page_title, extract_events
+
+DEFAULT_INDEX_PATH = 'events_index.sqlite'
+
+MONTHS = list(MONTH_TO_ENGLISH)
+
+
+def all_dates():
+    # 2024 - високосный год, поэтому в нем есть все 366 дат, включая 29 февраля
+    current = date(2024, 1, 1)
+    while current.year == 2024:
+        yield current.day, current.month
+        current += timedelta(days=1)
+
+
+def page_name(day, month):
+    return f"{MONTH_TO_ENGLISH[MONTHS[month - 1]]}_{day}"
+
+
+class EventsIndex:
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS events (
+                month INTEGER NOT NULL,
+                day INTEGER NOT NULL,
+                events_text TEXT NOT NULL,
+                total_words INTEGER NOT NULL,
+                words_with_a INTEGER NOT NULL,
+                words_with_o INTEGER NOT NULL,
+                shifted_text TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (month, day)
+            )
+        ''')
+        self.db.commit()
+        self.entries = {}
+        self.load()
+
+    def load(self):
+        # Весь индекс - не больше 366 записей, поэтому поиск идет по словарю в памяти
+        rows = self.db.execute('SELECT month, day, events_text, total_words, words_with_a, words_with_o, '
+                               'shifted_text, updated_at FROM events')
+        self.entries = {
+            (month, day): {
+                'events_text': events_text,
+                'total_words': total_words,
+                'words_with_a': words_with_a,
+                'words_with_o': words_with_o,
+                'shifted_text': shifted_text,
+                'updated_at': updated_at,
+            }
+            for month, day, events_text, total_words, words_with_a, words_with_o, shifted_text, updated_at in rows
+        }
+
+    @staticmethod
+    def key(day, month_name):
+        month_name = month_name.lower()
+        if month_name not in MONTH_TO_ENGLISH:
+            return None
+        return MONTHS.index(month_name) + 1, int(day)
+
+    def get(self, day, month_name):
+        key = self.key(day, month_name)
+        return self.entries.get(key) if key else None
+
+    def put(self, day, month, events_text):
+        stats = TextProcessor.analyze(events_text)
+        entry = {
+            'events_text': events_text,
+            'total_words': stats['total_words'],
+            'words_with_a': stats['words_with_a'],
+            'words_with_o': stats['words_with_o'],
+            'shifted_text': stats['shifted_text'],
+            'updated_at': time.time(),
+        }
+
+        with self.lock:
+            self.db.execute('INSERT OR REPLACE INTO events VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                            (month, day, entry['events_text'], entry['total_words'], entry['words_with_a'],
+                             entry['words_with_o'], entry['shifted_text'], entry['updated_at']))
+            self.db.commit()
+            self.entries[(month, day)] = entry
+        return entry
+
+    def stale_dates(self, max_age=None):
+        now = time.time()
+        for day, month in all_dates():
+            entry = self.entries.get((month, day))
+            if entry is None or (max_age is not None and now - entry['updated_at'] > max_age):
+                yield day, month
+
+    def __len__(self):
+        return len(self.entries)
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+def import_from_dir(index, directory, dates, parser=None):
+    parser = parser or WeatherParser()
+    imported = 0
+
+    for day, month in dates:
+        path = os.path.join(directory, page_name(day, month) + '.html')
+        if not os.path.exists(path):
+            continue
+
+        with open(path, 'rb') as f:
+            events_text = parser.extract_wikipedia_events(f.read())
+        if events_text:
+            index.put(day, month, " | ".join(events_text[:3]))
+            imported += 1
+
+    return imported
+
+
+def crawl(index, dates, parser=None):
+    parser = parser or WeatherParser()
+    dates = list(dates)
+    if not dates:
+        return 0
+
+    def fetch_events(day, month):
+        url = f"{parser.wiki_url}/{page_name(day, month)}"
+        parser.acquire_wiki_token(url)
+        print(f"Запрос к Википедии: {url}")
+        return parser.extract_wikipedia_events(parser.fetch(url).content)
+
+    crawled = 0
+    with ThreadPoolExecutor(max_workers=min(parser.max_workers, len(dates))) as executor:
+        futures = {executor.submit(fetch_events, day, month): (day, month) for day, month in dates}
+        for future in as_completed(futures):
+            day, month = futures[future]
+            try:
+                events_text = future.result()
+            except Exception as e:
+                print(f"Ошибка загрузки {page_name(day, month)}: {e}")
+                continue
+            if events_text:
+                index.put(day, month, " | ".join(events_text[:3]))
+                crawled += 1
+
+    return crawled
+
+
+def crawl_api(index, dates, parser=None):
+    # Те же даты через MediaWiki API: 366 дат - 8 запросов вместо 366
+    parser = parser or WeatherParser()
+
+    def fetch(url):
+        parser.acquire_wiki_token(url)
+        return parser.fetch(url)
+
+    client = WikiApiClient(api_url(parser.wiki_url), fetch)
+    titles = {page_title(day, MONTHS[month - 1]): (day, month) for day, month in dates}
+    ordered = list(titles)
+
+    crawled = 0
+    for start in range(0, len(ordered), MAX_TITLES):
+        batch = ordered[start:start + MAX_TITLES]
+        print(f"Запрос к API Википедии: {len(batch)} дат, начиная с {batch[0]}")
+        try:
+            pages = client.fetch_pages(batch)
+        except Exception as e:
+            print(f"Ошибка запроса к API Википедии: {e}")
+            continue
+        for title in batch:
+            events_text = extract_events(pages[title] or '')
+            if events_text:
+                day, month = titles[title]
+                index.put(day, month, " | ".join(events_text[:3]))
+                crawled += 1
+
+    return crawled
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Индекс событий Википедии по датам")
+    parser.add_argument('--index', default=DEFAULT_INDEX_PATH, help="путь к файлу индекса")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build = commands.add_parser('build', help="построить индекс для всех 366 дат")
+    refresh = commands.add_parser('refresh', help="обновить отсутствующие и устаревшие записи")
+    refresh.add_argument('--max-age-days', type=float, default=30, help="возраст записи, после которого она устарела")
+    for command in (build, refresh):
+        command.add_argument('--from-dir', help="каталог с сохраненными страницами вида October_13.html")
+        command.add_argument('--rps', type=float, default=1.0, help="запросов к Википедии в секунду")
+        command.add_argument('--wiki-url', default="https://ru.wikipedia.org/wiki")
+        command.add_argument('--api', action='store_true',
+                             help="загружать вики-текст через MediaWiki API по 50 дат в запросе")
+
+    show = commands.add_parser('show', help="показать запись индекса")
+    show.add_argument('day')
+    show.add_argument('month', help="месяц в родительном падеже, например 'октября'")
+
+    args = parser.parse_args(argv)
+    index = EventsIndex(args.index)
+
+    if args.command == 'show':
+        entry = index.get(args.day, args.month)
+        if entry is None:
+            print("Запись не найдена")
+            return 1
+        for name, value in entry.items():
+            print(f"{name}: {value}")
+        return 0
+
+    max_age = None if args.command == 'build' else args.max_age_days * 24 * 3600
+    dates = list(all_dates()) if args.command == 'build' else list(index.stale_dates(max_age))
+
+    weather_parser = WeatherParser(wiki_url=args.wiki_url, wiki_rps=args.rps)
+    if args.from_dir:
+        updated = import_from_dir(index, args.from_dir, dates, weather_parser)
+    elif args.api:
+        updated = crawl_api(index, dates, weather_parser)
+    else:
+        updated = crawl(index, dates, weather_parser)
+
+    print(f"Обновлено записей: {updated} из {len(dates)}, всего в индексе: {len(index)}")
+    index.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,193 @@
+import sys
+from array import array
+
+import numpy as np
+
+UNKNOWN_DATE = "Неизвестно"
+
+# Месяцы в родительном падеже, как в датах прогнозов, и их английские названия
+# (адреса статей Википедии)
+MONTH_TO_ENGLISH = {
+    'января': 'January', 'февраля': 'February', 'марта': 'March',
+    'апреля': 'April', 'мая': 'May', 'июня': 'June',
+    'июля': 'July', 'августа': 'August', 'сентября': 'September',
+    'октября': 'October', 'ноября': 'November', 'декабря': 'December'
+}
+
+# В CSV булевы значения читаются строками
+TRUE_VALUES = (True, 'True', 'true', '1', 1)
+
+
+class ForecastDay:
+    # Один день прогноза одного сайта. __slots__ вместо словаря: около 85 байт на день
+    # вместо 300 (bench_records.py) и вдвое более быстрый доступ к полям. Даты
+    # интернируются: у разных сайтов и запусков одна и та же дата хранится одной строкой.
+    __slots__ = ('date', 'day_temp', 'night_temp', 'fallback')
+
+    def __init__(self, date, day_temp, night_temp, fallback=False):
+        self.date = sys.intern(date)
+        self.day_temp = day_temp
+        self.night_temp = night_temp
+        self.fallback = fallback
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['date'], data['day_temp'], data['night_temp'], data.get('fallback') in TRUE_VALUES)
+
+    def to_dict(self):
+        # Для JSON API сервиса и batch.py; fallback пишется только у тестовых данных
+        data = {'date': self.date, 'day_temp': self.day_temp, 'night_temp': self.night_temp}
+        if self.fallback:
+            data['fallback'] = True
+        return data
+
+    def __eq__(self, other):
+        if not isinstance(other, ForecastDay):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in ForecastDay.__slots__)
+
+    def __repr__(self):
+        return (f"{type(self).__name__}({self.date!r}, {self.day_temp!r}, {self.night_temp!r}"
+                + (", fallback=True)" if self.fallback else ")"))
+
+
+class AverageDay(ForecastDay):
+    # Усредненный день: температуры округлены для вывода, original_day_temp - без округления,
+    # по нему ищется самый холодный день
+    __slots__ = ('original_day_temp',)
+
+    def __init__(self, date, day_temp, night_temp, original_day_temp, fallback=False):
+        super().__init__(date, day_temp, night_temp, fallback)
+        self.original_day_temp = original_day_temp
+
+
+class DayResult:
+    # Обработанный день: средняя температура, расстояние до самого холодного дня и анализ событий
+    __slots__ = ('date', 'day_temp', 'night_temp', 'days_until_coldest', 'total_words',
+                 'words_with_a', 'words_with_o', 'original_text', 'shifted_text', 'fallback')
+
+    def __init__(self, date, day_temp, night_temp, days_until_coldest, total_words, words_with_a,
+                 words_with_o, original_text, shifted_text, fallback=False):
+        self.date = date
+        self.day_temp = day_temp
+        self.night_temp = night_temp
+        self.days_until_coldest = days_until_coldest
+        self.total_words = total_words
+        self.words_with_a = words_with_a
+        self.words_with_o = words_with_o
+        self.original_text = original_text
+        self.shifted_text = shifted_text
+        self.fallback = fallback
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in DayResult.__slots__}
+
+
+def column(values, dtype):
+    # np.frombuffer не принимает пустой буфер
+    return np.frombuffer(values, dtype=dtype) if len(values) else np.empty(0, dtype=dtype)
+
+
+class ForecastTable:
+    # Прогнозы нескольких сайтов в столбцах array: номер сайта, номер дня, номер даты в
+    # таблице строк дат и температуры float32 (как в history.py; сайты дают целые градусы).
+    # Строка таблицы занимает 16 байт; агрегация берет столбцы как массивы NumPy без
+    # обхода объектов.
+    def __init__(self, sources=()):
+        self.sources = []
+        self.source_ids = {}
+        self.dates = []
+        self.date_ids = {}
+
+        self.source = array('B')
+        self.index = array('H')
+        self.date = array('I')
+        self.day_temp = array('f')
+        self.night_temp = array('f')
+        self.fallback = array('B')
+
+        for source in sources:
+            self.source_id(source)
+
+    @classmethod
+    def from_days(cls, all_data):
+        # Список прогнозов сайтов (списки ForecastDay) в порядке сайтов
+        table = cls(range(len(all_data)))
+        for source, days in enumerate(all_data):
+            table.extend(source, days)
+        return table
+
+    def source_id(self, source):
+        source_id = self.source_ids.get(source)
+        if source_id is None:
+            source_id = self.source_ids[source] = len(self.sources)
+            self.sources.append(source)
+        return source_id
+
+    def date_id(self, text):
+        date_id = self.date_ids.get(text)
+        if date_id is None:
+            date_id = self.date_ids[text] = len(self.dates)
+            self.dates.append(text)
+        return date_id
+
+    def append(self, source, index, day):
+        self.source.append(self.source_id(source))
+        self.index.append(index)
+        self.date.append(self.date_id(day.date))
+        self.day_temp.append(np.nan if day.day_temp is None else day.day_temp)
+        self.night_temp.append(np.nan if day.night_temp is None else day.night_temp)
+        self.fallback.append(day.fallback)
+
+    def extend(self, source, days):
+        for index, day in enumerate(days):
+            self.append(source, index, day)
+
+    def __len__(self):
+        return len(self.source)
+
+    def row(self, i):
+        day_temp, night_temp = float(self.day_temp[i]), float(self.night_temp[i])
+        return ForecastDay(self.dates[self.date[i]], None if np.isnan(day_temp) else day_temp,
+                           None if np.isnan(night_temp) else night_temp, bool(self.fallback[i]))
+
+    def days(self, source):
+        rows = np.flatnonzero(column(self.source, np.uint8) == self.source_ids[source])
+        rows = rows[np.argsort(column(self.index, np.uint16)[rows], kind='stable')]
+        return [self.row(i) for i in rows]
+
+    def fallback_sources(self):
+        sources = column(self.source, np.uint8)[column(self.fallback, np.uint8).astype(bool)]
+        return [self.sources[i] for i in np.unique(sources)]
+
+    def day_count(self):
+        return int(column(self.index, np.uint16).max()) + 1 if len(self) else 0
+
+    def temperature_array(self, days=None):
+        # Массив (сайт x день x {день, ночь}) для aggregation; отсутствующие значения - NaN
+        if days is None:
+            days = self.day_count()
+        temps = np.full((len(self.sources), days, 2), np.nan)
+        index = column(self.index, np.uint16)
+        keep = index < days
+        source = column(self.source, np.uint8)[keep]
+        temps[source, index[keep], 0] = column(self.day_temp, np.float32)[keep]
+        temps[source, index[keep], 1] = column(self.night_temp, np.float32)[keep]
+        return temps
+
+    def display_dates(self, days=None):
+        # Для каждого дня - дата первого по порядку сайта, у которого она известна
+        if days is None:
+            days = self.day_count()
+        index = column(self.index, np.uint16)
+        order = np.lexsort((column(self.source, np.uint8), index))
+        candidates = [[] for _ in range(days)]
+        for i in order:
+            if index[i] < days:
+                candidates[index[i]].append(self.dates[self.date[i]])
+        return [next((date for date in dates if date != UNKNOWN_DATE), dates[0] if dates else f"День {day + 1}")
+                for day, dates in enumerate(candidates)]
+
+    def nbytes(self):
+        columns = (self.source, self.index, self.date, self.day_temp, self.night_temp, self.fallback)
+        return sum(values.itemsize * len(values) for values in columns)
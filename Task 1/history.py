@@ -0,0 +1,346 @@
+import argparse
+import os
+import re
+import struct
+import sys
+import threading
+import time
+from bisect import bisect_left
+from datetime import date, datetime, timedelta, timezone
+
+import numpy as np
+
+from forecast import MONTH_TO_ENGLISH, ForecastDay
+
+DEFAULT_HISTORY_PATH = 'forecast_history.bin'
+
+# Запись фиксированной ширины (25 байт): время запуска, город, целевая дата (дни от 1970-01-01),
+# дневная и ночная температура, сайт. Город и сайт хранятся номерами из файла имен <path>.names.
+RECORD_DTYPE = np.dtype([
+    ('run_time', '<i8'),
+    ('city', '<u4'),
+    ('target', '<i4'),
+    ('day_temp', '<f4'),
+    ('night_temp', '<f4'),
+    ('source', 'u1'),
+])
+
+MAGIC = b'FCHIST01'
+HEADER = struct.Struct('<8sII')
+
+DAY_SECONDS = 24 * 3600
+
+# Даты на сайтах прогнозов - московские, поэтому день запуска и заблаговременность
+# считаются по тому же времени (UTC+3, без перехода на летнее время). По UTC у запусков
+# с 00:00 до 03:00 по Москве заблаговременность сдвигалась бы на день.
+FORECAST_TZ = timezone(timedelta(hours=3), 'MSK')
+UTC_OFFSET = 3 * 3600
+
+# Фактическая погода записывается как сайт с этим именем; если ее нет, фактом считается
+# среднее прогнозов, сделанных в сам целевой день
+OBSERVED = 'observed'
+
+MONTHS = list(MONTH_TO_ENGLISH)
+
+DATE_PATTERN = re.compile(r'(\d{1,2})\s*([а-яё]+)')
+NUMERIC_DATE_PATTERN = re.compile(r'(\d{1,2})\.(\d{1,2})')
+
+
+def to_day(value):
+    return (value - date(1970, 1, 1)).days
+
+
+def from_day(day):
+    return date(1970, 1, 1) + timedelta(days=int(day))
+
+
+def day_start(day):
+    # Время запуска (unix time) в начале дня day по московскому времени
+    return day * DAY_SECONDS - UTC_OFFSET
+
+
+def run_days(run_times):
+    # Номер московского дня для времени запуска (числа или массива)
+    return (run_times + UTC_OFFSET) // DAY_SECONDS
+
+
+def target_date(text, run_date, index):
+    # Год в датах сайтов не указан: берется ближайшая к запуску дата, а если дату
+    # разобрать не удалось - день запуска плюс номер дня прогноза
+    day = month = None
+    match = DATE_PATTERN.search(text.lower())
+    if match and match.group(2) in MONTH_TO_ENGLISH:
+        day, month = int(match.group(1)), MONTHS.index(match.group(2)) + 1
+    else:
+        match = NUMERIC_DATE_PATTERN.search(text)
+        if match:
+            day, month = int(match.group(1)), int(match.group(2))
+
+    if day is not None:
+        for year in (run_date.year, run_date.year + 1, run_date.year - 1):
+            try:
+                candidate = date(year, month, day)
+            except ValueError:
+                continue
+            if abs((candidate - run_date).days) <= 180:
+                return candidate
+    return run_date + timedelta(days=index)
+
+
+class ForecastHistory:
+    def __init__(self, path=DEFAULT_HISTORY_PATH):
+        self.path = path
+        self.names_path = path + '.names'
+        self.lock = threading.Lock()
+
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            with open(path, 'wb') as f:
+                f.write(HEADER.pack(MAGIC, 1, RECORD_DTYPE.itemsize))
+
+        with open(path, 'rb') as f:
+            magic, _, itemsize = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or itemsize != RECORD_DTYPE.itemsize:
+            raise ValueError(f"{path} не является файлом истории прогнозов")
+
+        self.names = {'source': [], 'city': []}
+        self.ids = {'source': {}, 'city': {}}
+        if os.path.exists(self.names_path):
+            with open(self.names_path, encoding='utf-8') as f:
+                for line in f:
+                    kind, name = line.rstrip('\n').split('\t', 1)
+                    self.ids[kind][name] = len(self.names[kind])
+                    self.names[kind].append(name)
+
+        self.file = open(path, 'ab')
+        self.mapped = None
+        self.last_run_time = int(self.records['run_time'][-1]) if len(self) else None
+
+    def name_id(self, kind, name):
+        ids = self.ids[kind]
+        if name not in ids:
+            with open(self.names_path, 'a', encoding='utf-8') as f:
+                f.write(f"{kind}\t{name}\n")
+            ids[name] = len(self.names[kind])
+            self.names[kind].append(name)
+        return ids[name]
+
+    def __len__(self):
+        return (os.path.getsize(self.path) - HEADER.size) // RECORD_DTYPE.itemsize
+
+    @property
+    def records(self):
+        # Файл отображается в память заново, только если он вырос после прошлого обращения
+        count = len(self)
+        if self.mapped is None or len(self.mapped) != count:
+            if count == 0:
+                self.mapped = np.zeros(0, dtype=RECORD_DTYPE)
+            else:
+                self.mapped = np.memmap(self.path, dtype=RECORD_DTYPE, mode='r', offset=HEADER.size,
+                                        shape=(count,))
+        return self.mapped
+
+    def append_array(self, rows):
+        # Записи только дописываются в конец и идут по неубыванию run_time,
+        # поэтому диапазон запусков находится двоичным поиском
+        if len(rows) == 0:
+            return 0
+        rows = np.asarray(rows, dtype=RECORD_DTYPE)
+        run_times = rows['run_time']
+        with self.lock:
+            if np.any(run_times[1:] < run_times[:-1]) or (
+                    self.last_run_time is not None and run_times[0] < self.last_run_time):
+                raise ValueError("Записи истории должны добавляться в порядке времени запуска")
+            self.file.write(rows.tobytes())
+            self.file.flush()
+            self.last_run_time = int(run_times[-1])
+        return len(rows)
+
+    def append_run(self, run_time, city, source_data):
+        # source_data - {сайт: [ForecastDay, ...]}, как в Weather.run_forecast()
+        run_time = int(run_time)
+        run_date = datetime.fromtimestamp(run_time, FORECAST_TZ).date()
+        city_id = self.name_id('city', city)
+
+        rows = []
+        for source, days in source_data.items():
+            source_id = self.name_id('source', source)
+            for index, day in enumerate(days):
+                if day.fallback:
+                    # Тестовые данные вместо прогноза сайта в историю не попадают
+                    continue
+                rows.append((run_time, city_id, to_day(target_date(day.date, run_date, index)),
+                             day.day_temp, day.night_temp, source_id))
+        return self.append_array(np.array(rows, dtype=RECORD_DTYPE))
+
+    def run_slice(self, start=None, end=None):
+        # np.searchsorted копирует столбец из записей целиком, а bisect читает только
+        # log2(n) записей, то есть несколько страниц файла
+        records = self.records
+        run_times = records['run_time']
+        lo = 0 if start is None else bisect_left(run_times, int(start))
+        hi = len(records) if end is None else bisect_left(run_times, int(end))
+        return records[lo:hi]
+
+    @staticmethod
+    def leads(rows):
+        return rows['target'] - run_days(rows['run_time'])
+
+    def forecasts_for(self, target, city=None, min_lead=1, max_lead=7):
+        # Прогнозы на дату target, сделанные за min_lead..max_lead дней до нее
+        target_day = to_day(target)
+        rows = self.run_slice(day_start(target_day - max_lead), day_start(target_day - min_lead + 1))
+        mask = rows['target'] == target_day
+        if city is not None:
+            mask &= rows['city'] == self.ids['city'].get(city, -1)
+        return np.array(rows[mask])
+
+    def actuals(self, rows):
+        # Возвращает отсортированные ключи (город, дата) и фактические температуры для них
+        keys = rows['city'].astype(np.int64) << 32 | (rows['target'].astype(np.int64) & 0xFFFFFFFF)
+        observed_id = self.ids['source'].get(OBSERVED, -1)
+        observed = rows['source'] == observed_id
+        same_day = (self.leads(rows) == 0) & ~observed
+
+        fallback = same_day & ~np.isin(keys, keys[observed])
+        selected = observed | fallback
+        unique_keys, inverse = np.unique(keys[selected], return_inverse=True)
+        counts = np.bincount(inverse, minlength=len(unique_keys))
+        values = np.stack([
+            np.bincount(inverse, weights=rows['day_temp'][selected], minlength=len(unique_keys)) / counts,
+            np.bincount(inverse, weights=rows['night_temp'][selected], minlength=len(unique_keys)) / counts,
+        ], axis=1) if len(unique_keys) else np.zeros((0, 2))
+        return unique_keys, values, keys
+
+    def error_stats(self, start=None, end=None, city=None, max_lead=7):
+        # Средняя абсолютная ошибка и смещение прогнозов по сайтам и заблаговременности
+        # для запусков из [start, end); читается только этот диапазон истории
+        rows = self.run_slice(start, None if end is None else end + (max_lead + 1) * DAY_SECONDS)
+        if city is not None:
+            rows = rows[rows['city'] == self.ids['city'].get(city, -1)]
+        rows = np.array(rows)
+
+        actual_keys, actual_values, keys = self.actuals(rows)
+        leads = self.leads(rows)
+        observed_id = self.ids['source'].get(OBSERVED, -1)
+        mask = (leads >= 1) & (leads <= max_lead) & (rows['source'] != observed_id)
+        if end is not None:
+            mask &= rows['run_time'] < end
+
+        positions = np.searchsorted(actual_keys, keys[mask])
+        positions = np.minimum(positions, max(len(actual_keys) - 1, 0))
+        found = actual_keys[positions] == keys[mask] if len(actual_keys) else np.zeros(int(mask.sum()), bool)
+
+        forecast = rows[mask][found]
+        actual = actual_values[positions[found]]
+        groups = forecast['source'].astype(np.int64) * (max_lead + 1) + leads[mask][found]
+
+        size = (max(len(self.names['source']), 1)) * (max_lead + 1)
+        count = np.bincount(groups, minlength=size)
+        day_error = forecast['day_temp'] - actual[:, 0]
+        night_error = forecast['night_temp'] - actual[:, 1]
+
+        sums = {
+            'mae_day': np.bincount(groups, weights=np.abs(day_error), minlength=size),
+            'bias_day': np.bincount(groups, weights=day_error, minlength=size),
+            'mae_night': np.bincount(groups, weights=np.abs(night_error), minlength=size),
+            'bias_night': np.bincount(groups, weights=night_error, minlength=size),
+        }
+
+        stats = []
+        for group in np.flatnonzero(count):
+            source_id, lead = divmod(int(group), max_lead + 1)
+            row = {'source': self.names['source'][source_id], 'lead': lead, 'count': int(count[group])}
+            row.update({name: float(values[group] / count[group]) for name, values in sums.items()})
+            stats.append(row)
+        return stats
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+        self.mapped = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def ingest(history, records, city, run_time):
+    # Принимает записи Weather.py (type 'source') и строки batch.py (city, sources)
+    source_data = {}
+    written = 0
+    for record in records:
+        if 'sources' in record:
+            sources = {source: [ForecastDay.from_dict(day) for day in days] for source, days in record['sources'].items()}
+            written += history.append_run(run_time, record['city'], sources)
+        elif record.get('type') == 'source':
+            source_data.setdefault(record['source'], []).append(ForecastDay.from_dict(record))
+    if source_data:
+        written += history.append_run(run_time, city, source_data)
+    return written
+
+
+def parse_date(text):
+    return datetime.strptime(text, '%Y-%m-%d').date()
+
+
+def parse_time(text):
+    return int(datetime.strptime(text, '%Y-%m-%d').replace(tzinfo=FORECAST_TZ).timestamp())
+
+
+def main(argv=None):
+    from sinks import read_records
+
+    parser = argparse.ArgumentParser(description="История прогнозов и их точность")
+    parser.add_argument('--history', default=DEFAULT_HISTORY_PATH, help="файл истории")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    add = commands.add_parser('ingest', help="добавить прогнозы из файла результатов Weather.py или batch.py")
+    add.add_argument('records', help="файл записей (jsonl, csv, parquet, arrow)")
+    add.add_argument('--city', default='moscow', help="город для записей Weather.py")
+    add.add_argument('--run-time', type=float, help="время запуска, unix time (по умолчанию время файла)")
+
+    show = commands.add_parser('forecasts', help="прогнозы на дату, сделанные за 1..7 дней")
+    show.add_argument('date', help="дата в формате ГГГГ-ММ-ДД")
+    show.add_argument('--city')
+    show.add_argument('--min-lead', type=int, default=1)
+    show.add_argument('--max-lead', type=int, default=7)
+
+    accuracy = commands.add_parser('accuracy', help="ошибки прогнозов по сайтам")
+    accuracy.add_argument('--from', dest='start', type=parse_time, help="начало периода, ГГГГ-ММ-ДД")
+    accuracy.add_argument('--to', dest='end', type=parse_time, help="конец периода, ГГГГ-ММ-ДД")
+    accuracy.add_argument('--city')
+    accuracy.add_argument('--max-lead', type=int, default=7)
+
+    args = parser.parse_args(argv)
+
+    with ForecastHistory(args.history) as history:
+        if args.command == 'ingest':
+            run_time = args.run_time if args.run_time is not None else os.path.getmtime(args.records)
+            written = ingest(history, read_records(args.records), args.city, run_time)
+            print(f"Добавлено записей: {written}, всего в истории: {len(history)}")
+
+        elif args.command == 'forecasts':
+            target = parse_date(args.date)
+            rows = history.forecasts_for(target, args.city, args.min_lead, args.max_lead)
+            for row in rows:
+                made = datetime.fromtimestamp(int(row['run_time']), FORECAST_TZ).strftime('%Y-%m-%d %H:%M')
+                print(f"{made}  {history.names['city'][row['city']]:<16}{history.names['source'][row['source']]:<16}"
+                      f"днем {row['day_temp']:+.0f}°C, ночью {row['night_temp']:+.0f}°C")
+            print(f"Прогнозов: {len(rows)}")
+
+        else:
+            started = time.perf_counter()
+            stats = history.error_stats(args.start, args.end, args.city, args.max_lead)
+            print(f"{'Сайт':<16}{'Дней':>6}{'Прогнозов':>11}{'MAE днем':>10}{'Смещ. днем':>12}"
+                  f"{'MAE ночью':>11}{'Смещ. ночью':>13}")
+            for row in stats:
+                print(f"{row['source']:<16}{row['lead']:>6}{row['count']:>11}{row['mae_day']:>10.2f}"
+                      f"{row['bias_day']:>+12.2f}{row['mae_night']:>11.2f}{row['bias_night']:>+13.2f}")
+            print(f"Время запроса: {(time.perf_counter() - started) * 1000:.1f} мс")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,188 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+DEFAULT_TTL = 3600
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+
+# Тело хранится уже распакованным, поэтому эти заголовки к нему не относятся
+DROPPED_HEADERS = ('content-encoding', 'content-length', 'transfer-encoding', 'connection')
+
+
+class ResponseCache:
+    def __init__(self, cache_dir, ttls=None, default_ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, 'http_cache.sqlite')
+        self.ttls = sorted((ttls or {}).items(), key=lambda item: len(item[0]), reverse=True)
+        self.default_ttl = default_ttl
+        self.max_bytes = max_bytes
+
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(self.path, check_same_thread=False)
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                status INTEGER NOT NULL,
+                headers TEXT NOT NULL,
+                body BLOB NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                stored_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                size INTEGER NOT NULL
+            )
+        ''')
+        self.db.execute('CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)')
+        self.db.commit()
+
+    def ttl_for(self, url):
+        for prefix, ttl in self.ttls:
+            if url.startswith(prefix):
+                return ttl
+        return self.default_ttl
+
+    def get(self, url):
+        with self.lock:
+            row = self.db.execute(
+                'SELECT status, headers, body, etag, last_modified, stored_at FROM responses WHERE url = ?',
+                (url,)).fetchone()
+            if row is None:
+                return None
+            self.db.execute('UPDATE responses SET last_access = ? WHERE url = ?', (time.time(), url))
+            self.db.commit()
+
+        status, headers, body, etag, last_modified, stored_at = row
+        return {
+            'status': status,
+            'headers': json.loads(headers),
+            'body': body,
+            'etag': etag,
+            'last_modified': last_modified,
+            'stored_at': stored_at,
+        }
+
+    def count(self, counter):
+        with self.lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def is_fresh(self, url, entry):
+        return time.time() - entry['stored_at'] < self.ttl_for(url)
+
+    def has_fresh(self, url):
+        # Будет ли запрос обслужен из кэша без обращения к сайту; last_access не меняется
+        with self.lock:
+            row = self.db.execute('SELECT stored_at FROM responses WHERE url = ?', (url,)).fetchone()
+        return row is not None and time.time() - row[0] < self.ttl_for(url)
+
+    def store(self, url, status, headers, body):
+        headers = CaseInsensitiveDict(
+            {name: value for name, value in headers.items() if name.lower() not in DROPPED_HEADERS})
+        now = time.time()
+
+        with self.lock:
+            self.db.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (url, status, json.dumps(dict(headers)), sqlite3.Binary(body),
+                 headers.get('ETag'), headers.get('Last-Modified'), now, now, len(body)))
+            self.evict()
+            self.db.commit()
+
+    def touch(self, url):
+        now = time.time()
+        with self.lock:
+            self.db.execute('UPDATE responses SET stored_at = ?, last_access = ? WHERE url = ?', (now, now, url))
+            self.db.commit()
+
+    def evict(self):
+        total = self.db.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        for url, size in self.db.execute('SELECT url, size FROM responses ORDER BY last_access').fetchall():
+            if total <= self.max_bytes:
+                break
+            self.db.execute('DELETE FROM responses WHERE url = ?', (url,))
+            total -= size
+
+    def size(self):
+        with self.lock:
+            return self.db.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses').fetchone()
+
+    def stats(self):
+        entries, total_bytes = self.size()
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'revalidations': self.revalidations,
+            'entries': entries,
+            'bytes': total_bytes,
+        }
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+class CachingAdapter(BaseAdapter):
+    def __init__(self, cache, inner=None):
+        super().__init__()
+        self.cache = cache
+        self.inner = inner or HTTPAdapter()
+
+    def send(self, request, **kwargs):
+        if request.method != 'GET':
+            return self.inner.send(request, **kwargs)
+
+        url = request.url
+        entry = self.cache.get(url)
+
+        if entry is not None and self.cache.is_fresh(url, entry):
+            self.cache.count('hits')
+            return self.build_response(request, entry)
+
+        if entry is not None and (entry['etag'] or entry['last_modified']):
+            conditional = request.copy()
+            if entry['etag']:
+                conditional.headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                conditional.headers['If-Modified-Since'] = entry['last_modified']
+
+            response = self.inner.send(conditional, **kwargs)
+            if response.status_code == 304:
+                response.close()
+                self.cache.count('revalidations')
+                self.cache.touch(url)
+                return self.build_response(request, entry)
+        else:
+            response = self.inner.send(request, **kwargs)
+
+        self.cache.count('misses')
+        if response.status_code == 200:
+            self.cache.store(url, response.status_code, response.headers, response.content)
+        return response
+
+    def build_response(self, request, entry):
+        response = Response()
+        response.status_code = entry['status']
+        response.headers = CaseInsensitiveDict(entry['headers'])
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = entry['body']
+        response.url = request.url
+        response.request = request
+        response.reason = 'OK'
+        response.from_cache = True
+        return response
+
+    def close(self):
+        self.inner.close()
@@ -0,0 +1,205 @@
+import cProfile
+import pstats
+import sys
+import threading
+import time
+from bisect import bisect_left
+
+# Границы корзин гистограмм задержек в секундах, как у клиентов Prometheus
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HISTOGRAMS = {
+    'fetch': "Время загрузки страницы, с",
+    'parse': "Время разбора страницы, с",
+}
+
+COUNTERS = {
+    'bytes_downloaded': "Загружено байт",
+    'fallbacks': "Сколько раз вместо данных сайта взяты тестовые данные",
+    'parse_failures': "Страница загружена, но данные из нее не извлечены",
+    'fetch_errors': "Ошибки загрузки страницы",
+    'hedged_requests': "Повторные запросы, отправленные после p95 времени ответа сайта",
+    'deadline_exceeded': "Запросы, не уложившиеся в бюджет сайта или общий срок запуска",
+    'circuit_open': "Запросы, пропущенные из-за открытого предохранителя сайта",
+}
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        # Оценка по корзинам: верхняя граница корзины, в которую попадает q-я доля наблюдений
+        if not self.count:
+            return None
+        rank = q * self.count
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            if total >= rank:
+                return bound
+        return float('inf')
+
+
+class Timer:
+    __slots__ = ('metrics', 'name', 'source', 'started')
+
+    def __init__(self, metrics, name, source):
+        self.metrics = metrics
+        self.name = name
+        self.source = source
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.observe(self.name, self.source, time.perf_counter() - self.started)
+
+
+class Metrics:
+    enabled = True
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+        self.stages = {}
+
+    def timer(self, name, source=None):
+        # Время попадает только в гистограмму name для сайта source. Загрузки идут в
+        # нескольких потоках сразу, поэтому их сумма больше времени этапа: время этапа
+        # замеряется один раз на его границе через stage
+        return Timer(self, name, source)
+
+    def stage(self, name):
+        return Timer(self, name, None)
+
+    def observe(self, name, source, seconds):
+        with self.lock:
+            if source is None:
+                self.stages[name] = self.stages.get(name, 0.0) + seconds
+                return
+            histogram = self.histograms.get((name, source))
+            if histogram is None:
+                histogram = self.histograms[(name, source)] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def count(self, name, source, value=1):
+        with self.lock:
+            self.counters[(name, source)] = self.counters.get((name, source), 0) + value
+
+    def to_prometheus(self):
+        lines = []
+        with self.lock:
+            for name, help_text in HISTOGRAMS.items():
+                metric = f"weather_{name}_seconds"
+                lines.append(f"# HELP {metric} {help_text}")
+                lines.append(f"# TYPE {metric} histogram")
+                for (histogram_name, source), histogram in sorted(self.histograms.items()):
+                    if histogram_name != name:
+                        continue
+                    total = 0
+                    for bound, count in zip(self.buckets + (float('inf'),), histogram.counts):
+                        total += count
+                        le = '+Inf' if bound == float('inf') else repr(bound)
+                        lines.append(f'{metric}_bucket{{source="{source}",le="{le}"}} {total}')
+                    lines.append(f'{metric}_sum{{source="{source}"}} {histogram.sum!r}')
+                    lines.append(f'{metric}_count{{source="{source}"}} {histogram.count}')
+
+            for name, help_text in COUNTERS.items():
+                metric = f"weather_{name}_total"
+                lines.append(f"# HELP {metric} {help_text}")
+                lines.append(f"# TYPE {metric} counter")
+                for (counter_name, source), value in sorted(self.counters.items()):
+                    if counter_name == name:
+                        lines.append(f'{metric}{{source="{source}"}} {value}')
+
+            lines.append("# HELP weather_stage_seconds_total Суммарное время этапа, с")
+            lines.append("# TYPE weather_stage_seconds_total counter")
+            for stage, seconds in sorted(self.stages.items()):
+                lines.append(f'weather_stage_seconds_total{{stage="{stage}"}} {seconds!r}')
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        with self.lock:
+            lines = ["Время этапов, с: " + ", ".join(f"{stage} {seconds:.3f}" for stage, seconds in self.stages.items())]
+            for (name, source), histogram in sorted(self.histograms.items()):
+                mean_ms = histogram.sum / histogram.count * 1000
+                lines.append(f"  {name:<6}{source:<15}запросов {histogram.count:<4}среднее {mean_ms:8.1f} мс, "
+                             f"p95 не больше {histogram.quantile(0.95)} с")
+            for (name, source), value in sorted(self.counters.items()):
+                lines.append(f"  {name:<17}{source:<15}{value}")
+        return "\n".join(lines)
+
+
+class NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+
+NULL_TIMER = NullTimer()
+
+
+class NullMetrics:
+    # Заглушка по умолчанию: ничего не измеряет и не выделяет памяти на вызов
+    enabled = False
+
+    def timer(self, name, source=None):
+        return NULL_TIMER
+
+    def stage(self, name):
+        return NULL_TIMER
+
+    def observe(self, name, source, seconds):
+        pass
+
+    def count(self, name, source, value=1):
+        pass
+
+
+NULL_METRICS = NullMetrics()
+
+
+def profile_call(path, function, *args, **kwargs):
+    # cProfile видит только свой поток, поэтому каждому новому потоку (пулы загрузки)
+    # дается свой профилировщик, а в конце все профили сливаются в один файл pstats,
+    # который читают python -m pstats, snakeviz, flameprof и gprof2dot
+    profilers = []
+
+    def start_thread_profiler(*_):
+        sys.setprofile(None)
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # В Python 3.12+ профилировщик уже активен для всех потоков
+            return
+        profilers.append(profiler)
+
+    main_profiler = cProfile.Profile()
+    threading.setprofile(start_thread_profiler)
+    try:
+        return main_profiler.runcall(function, *args, **kwargs)
+    finally:
+        threading.setprofile(None)
+        stats = pstats.Stats(main_profiler)
+        for profiler in profilers:
+            stats.add(profiler)
+        stats.dump_stats(path)
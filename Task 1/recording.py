@@ -0,0 +1,134 @@
+import argparse
+import json
+import sys
+import threading
+import time
+import zipfile
+from datetime import datetime
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from http_cache import DROPPED_HEADERS
+
+ARCHIVE_VERSION = 1
+INDEX_NAME = 'index.json'
+
+
+class RunRecorder:
+    # Один zip-архив на запуск: тело каждого ответа - отдельная сжатая запись, а index.json
+    # с адресами, статусами и заголовками пишется последним. Центральный каталог zip дает
+    # произвольный доступ к любому ответу без распаковки остальных. Записываются только
+    # ответы, которые WeatherParser принял: запрос, не уложившийся в бюджет, или проигравший
+    # повторный запрос в архив не попадает, и воспроизведение повторяет исходный запуск.
+    def __init__(self, path, settings=None):
+        self.path = path
+        # Адреса сайтов и Википедии на момент записи: при воспроизведении запросы идут по ним
+        self.settings = settings or {}
+        self.recorded_at = time.time()
+        self.zip = zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=6)
+        self.lock = threading.Lock()
+        self.responses = {}
+
+    def now(self):
+        return datetime.fromtimestamp(self.recorded_at)
+
+    def add(self, url, response):
+        with self.lock:
+            if url in self.responses:
+                return
+            entry = f"responses/{len(self.responses):06d}"
+            self.zip.writestr(entry, response.content)
+            self.responses[url] = {
+                'entry': entry,
+                'status': response.status_code,
+                'reason': response.reason,
+                'headers': {key: value for key, value in response.headers.items()
+                            if key.lower() not in DROPPED_HEADERS},
+            }
+
+    def close(self):
+        with self.lock:
+            if self.zip.fp is None:
+                return
+            index = {'version': ARCHIVE_VERSION, 'recorded_at': self.recorded_at, 'settings': self.settings,
+                     'responses': self.responses}
+            self.zip.writestr(INDEX_NAME, json.dumps(index, ensure_ascii=False, indent=1))
+            self.zip.close()
+
+
+class RunArchive:
+    def __init__(self, path):
+        self.path = path
+        self.zip = zipfile.ZipFile(path)
+        index = json.loads(self.zip.read(INDEX_NAME))
+        if index.get('version') != ARCHIVE_VERSION:
+            raise ValueError(f"Неподдерживаемая версия архива запуска: {index.get('version')}")
+        self.recorded_at = index['recorded_at']
+        self.settings = index.get('settings', {})
+        self.responses = index['responses']
+        self.lock = threading.Lock()
+
+    def now(self):
+        # Время записи вместо текущего: даты тестовых данных и прогноза совпадут с исходным запуском
+        return datetime.fromtimestamp(self.recorded_at)
+
+    def get(self, url):
+        meta = self.responses.get(url)
+        if meta is None:
+            return None, None
+        with self.lock:
+            body = self.zip.read(meta['entry'])
+        return meta, body
+
+    def __len__(self):
+        return len(self.responses)
+
+    def close(self):
+        self.zip.close()
+
+
+class ReplayAdapter(BaseAdapter):
+    def __init__(self, archive):
+        super().__init__()
+        self.archive = archive
+
+    def send(self, request, **kwargs):
+        meta, body = self.archive.get(request.url)
+        if meta is None:
+            raise requests.ConnectionError(f"Адреса нет в архиве запуска: {request.url}", request=request)
+
+        response = Response()
+        response.status_code = meta['status']
+        response.reason = meta['reason']
+        response.headers = CaseInsensitiveDict(meta['headers'])
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = body
+        response.url = request.url
+        response.request = request
+        response.from_cache = True
+        return response
+
+    def close(self):
+        pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Содержимое архива запуска")
+    parser.add_argument('archive')
+    args = parser.parse_args(argv)
+
+    archive = RunArchive(args.archive)
+    print(f"Запись от {archive.now():%Y-%m-%d %H:%M:%S}, ответов: {len(archive)}")
+    for url, meta in archive.responses.items():
+        info = archive.zip.getinfo(meta['entry'])
+        print(f"  {meta['status']} {info.file_size:>9} -> {info.compress_size:>8} байт  {url}")
+    archive.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
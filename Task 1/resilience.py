@@ -0,0 +1,126 @@
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+
+# Сколько ошибок подряд открывают предохранитель сайта и на сколько секунд
+FAILURE_THRESHOLD = 3
+COOLDOWN = 300
+# Окно последних времен ответа сайта и минимум замеров, после которого считается p95
+LATENCY_WINDOW = 20
+MIN_LATENCY_SAMPLES = 5
+
+
+class CircuitOpen(Exception):
+    pass
+
+
+class Deadline:
+    # Общий срок запуска: все загрузки должны уложиться в seconds секунд от создания
+    def __init__(self, seconds=None):
+        self.expires = None if seconds is None else time.monotonic() + seconds
+
+    def remaining(self):
+        if self.expires is None:
+            return float('inf')
+        return max(self.expires - time.monotonic(), 0.0)
+
+    def expired(self):
+        return self.remaining() <= 0
+
+
+class SourceHealth:
+    # Предохранители и недавние времена ответа по сайтам. Предохранитель открывается после
+    # failure_threshold ошибок подряд, и сайт не запрашивается cooldown секунд; после этого
+    # пропускается одна попытка: успех закрывает предохранитель, ошибка снова открывает.
+    # Состояние хранится в JSON-файле, потому что обычный запуск программы - один проход
+    # по сайтам, и без файла ни предохранитель, ни p95 не пережили бы завершения процесса.
+    # С failure_threshold=None предохранители не открываются, остаются только времена ответа.
+    def __init__(self, path=None, failure_threshold=FAILURE_THRESHOLD, cooldown=COOLDOWN,
+                 window=LATENCY_WINDOW, min_samples=MIN_LATENCY_SAMPLES):
+        self.path = path
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.window = window
+        self.min_samples = min_samples
+        self.lock = threading.Lock()
+        self.sources = {}
+        if path and os.path.exists(path):
+            self.load()
+
+    def load(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return
+        for source, state in saved.items():
+            entry = self.entry(source)
+            entry['failures'] = int(state.get('failures', 0))
+            entry['open_until'] = float(state.get('open_until', 0))
+            entry['latencies'].extend(state.get('latencies', []))
+
+    def save(self):
+        if not self.path:
+            return
+        with self.lock:
+            state = {source: {'failures': entry['failures'], 'open_until': entry['open_until'],
+                              'latencies': list(entry['latencies'])}
+                     for source, entry in self.sources.items()}
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary = self.path + '.tmp'
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(temporary, self.path)
+
+    def entry(self, source):
+        entry = self.sources.get(source)
+        if entry is None:
+            entry = self.sources[source] = {'failures': 0, 'open_until': 0.0,
+                                            'latencies': deque(maxlen=self.window)}
+        return entry
+
+    def open_until(self, source):
+        # Время (time.time()), до которого сайт пропускается, или None, если предохранитель закрыт
+        with self.lock:
+            entry = self.sources.get(source)
+            if entry is None or entry['open_until'] <= time.time():
+                return None
+            return entry['open_until']
+
+    def check(self, source):
+        open_until = self.open_until(source)
+        if open_until is not None:
+            until = time.strftime('%H:%M:%S', time.localtime(open_until))
+            raise CircuitOpen(f"сайт пропущен до {until} после {self.failure_threshold} ошибок подряд")
+
+    def record_success(self, source):
+        with self.lock:
+            entry = self.entry(source)
+            entry['failures'] = 0
+            entry['open_until'] = 0.0
+
+    def record_failure(self, source):
+        with self.lock:
+            entry = self.entry(source)
+            entry['failures'] += 1
+            if self.failure_threshold is not None and entry['failures'] >= self.failure_threshold:
+                entry['open_until'] = time.time() + self.cooldown
+                return True
+            return False
+
+    def observe_latency(self, source, seconds):
+        with self.lock:
+            self.entry(source)['latencies'].append(round(seconds, 4))
+
+    def p95(self, source):
+        with self.lock:
+            entry = self.sources.get(source)
+            if entry is None or len(entry['latencies']) < self.min_samples:
+                return None
+            latencies = sorted(entry['latencies'])
+        return latencies[math.ceil(0.95 * len(latencies)) - 1]
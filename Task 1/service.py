@@ -0,0 +1,273 @@
+import argparse
+import heapq
+import json
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from Weather import WeatherParser, SOURCE_TITLES, parse_source_values
+from aggregation import METHODS, average_forecasts, find_coldest_day
+from metrics import Metrics
+from sources import SOURCE_SPECS
+
+DEFAULT_INTERVAL = 15 * 60
+
+
+class ForecastService:
+    # Держит WeatherParser и последние прогнозы в памяти. Каждый сайт обновляется по своему
+    # расписанию; после каждого обновления ответы API собираются заново и сохраняются уже
+    # в виде байтов, поэтому запрос к API - это поиск в словаре и запись в сокет.
+    def __init__(self, weather_parser, intervals=None, default_interval=DEFAULT_INTERVAL, jitter=0.1,
+                 method='mean', weights=None, location=None):
+        self.weather_parser = weather_parser
+        self.intervals = {source: (intervals or {}).get(source, default_interval) for source in SOURCE_SPECS}
+        self.jitter = jitter
+        self.method = method
+        self.weights = [float((weights or {}).get(source, 1)) for source in SOURCE_SPECS]
+        self.location = location
+
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.started_at = time.time()
+        # failures - ошибки подряд после последнего удачного обновления
+        self.state = {source: {'days': [], 'updated_at': None, 'refreshes': 0, 'errors': 0, 'failures': 0,
+                               'last_error': None}
+                      for source in SOURCE_SPECS}
+        self.responses = {}
+        self.threads = []
+        self.executor = None
+        self.rebuild()
+
+    def next_delay(self, source):
+        interval = self.intervals[source]
+        return interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def refresh(self, source):
+        # fetch_source не подставляет тестовые данные: при неудаче остается последний
+        # настоящий прогноз сайта, а ошибка попадает в /health
+        try:
+            days = self.weather_parser.fetch_source(source, self.location)
+            error = None
+        except Exception as e:
+            days, error = None, str(e) or type(e).__name__
+
+        with self.lock:
+            state = self.state[source]
+            state['refreshes'] += 1
+            if error is None:
+                state['days'] = days
+                state['updated_at'] = time.time()
+                state['failures'] = 0
+            else:
+                state['errors'] += 1
+                state['failures'] += 1
+                state['last_error'] = error
+            self.rebuild()
+
+    def rebuild(self):
+        # Вызывается под self.lock; новые ответы подменяют старые одним присваиванием
+        all_data = [self.state[source]['days'] for source in SOURCE_SPECS]
+        average_temps = average_forecasts(all_data, self.method, self.weights)
+        coldest_day = find_coldest_day(average_temps) if average_temps else None
+
+        sources = {
+            source: {
+                'title': SOURCE_TITLES[source],
+                'updated_at': state['updated_at'],
+                'interval': self.intervals[source],
+                'days': [day.to_dict() for day in state['days']],
+            }
+            for source, state in self.state.items()
+        }
+        forecast = {
+            'method': self.method,
+            'average': [day.to_dict() for day in average_temps],
+            'coldest_day': coldest_day,
+            'updated_at': {source: state['updated_at'] for source, state in self.state.items()},
+        }
+
+        responses = {
+            '/forecast': forecast,
+            '/sources': sources,
+        }
+        for source, data in sources.items():
+            responses[f'/sources/{source}'] = data
+        self.responses = {path: json.dumps(body, ensure_ascii=False).encode('utf-8')
+                          for path, body in responses.items()}
+
+    def health(self):
+        with self.lock:
+            sources = {source: {key: state[key] for key in ('updated_at', 'refreshes', 'errors', 'last_error')}
+                       for source, state in self.state.items()}
+            for source, state in sources.items():
+                # Последнее обновление не удалось, и отдается прогноз, полученный в updated_at
+                state['stale'] = bool(self.state[source]['failures'] and self.state[source]['days'])
+        for source, state in sources.items():
+            state['circuit_open_until'] = self.weather_parser.health.open_until(source)
+        return {
+            'status': 'ok' if all(state['updated_at'] for state in sources.values()) else 'starting',
+            'uptime': time.time() - self.started_at,
+            'sources': sources,
+        }
+
+    def response(self, path):
+        if path == '/health':
+            return json.dumps(self.health(), ensure_ascii=False).encode('utf-8')
+        if path == '/metrics' and self.weather_parser.metrics.enabled:
+            return self.weather_parser.metrics.to_prometheus().encode('utf-8')
+        return self.responses.get(path)
+
+    def schedule(self):
+        # Один поток планировщика: очередь (время следующего обновления, сайт); сами
+        # обновления идут в пуле, поэтому медленный сайт не задерживает остальные
+        now = time.monotonic()
+        queue = [(now, source) for source in SOURCE_SPECS]
+        heapq.heapify(queue)
+        pending = {}
+
+        while not self.stop_event.is_set():
+            due, source = queue[0]
+            wait = due - time.monotonic()
+            if wait > 0:
+                self.stop_event.wait(wait)
+                continue
+
+            heapq.heappop(queue)
+            future = pending.get(source)
+            if future is None or future.done():
+                pending[source] = self.executor.submit(self.refresh, source)
+            heapq.heappush(queue, (due + self.next_delay(source), source))
+
+    def start(self):
+        self.executor = ThreadPoolExecutor(max_workers=self.weather_parser.max_workers)
+        thread = threading.Thread(target=self.schedule, daemon=True)
+        thread.start()
+        self.threads.append(thread)
+        return self
+
+    def wait_ready(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not all(state['refreshes'] for state in self.state.values()):
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def stop(self):
+        self.stop_event.set()
+        for thread in self.threads:
+            thread.join()
+        if self.executor:
+            self.executor.shutdown(wait=True)
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Заголовки и тело уходят одним пакетом; иначе на keep-alive соединении каждый ответ
+    # ждет отложенного подтверждения TCP (около 40 мс)
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        path = self.path.split('?', 1)[0].rstrip('/') or '/'
+        body = self.server.service.response(path)
+        if body is None:
+            self.send_error(404)
+            return
+
+        self.send_response(200)
+        if path == '/metrics':
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        else:
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ServiceServer:
+    def __init__(self, service, host='127.0.0.1', port=8080):
+        self.service = service
+        self.httpd = ThreadingHTTPServer((host, port), ServiceHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.service = service
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.service.start()
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.service.stop()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Сервис прогноза погоды с JSON API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--interval', type=float, default=DEFAULT_INTERVAL,
+                        help="период обновления сайта в секундах (по умолчанию 900)")
+    parser.add_argument('--intervals', default='', help="периоды для отдельных сайтов, например yandex=300,gismeteo=600")
+    parser.add_argument('--jitter', type=float, default=0.1, help="случайное отклонение периода, доля (по умолчанию 0.1)")
+    parser.add_argument('--method', choices=METHODS, default='mean')
+    parser.add_argument('--weights', default='', help="веса сайтов для --method weighted")
+    parser.add_argument('--cache-dir', help="каталог HTTP-кэша")
+    parser.add_argument('--stub', action='store_true', help="брать страницы с локального тестового сервера")
+    parser.add_argument('--metrics', action='store_true', help="собирать метрики и отдавать их на /metrics")
+    args = parser.parse_args(argv)
+    # Те же правила разбора и сообщения об ошибках, что у --weights и --budgets в Weather.py
+    try:
+        intervals = parse_source_values(args.intervals, SOURCE_SPECS, 'периода')
+        weights = parse_source_values(args.weights, SOURCE_SPECS, 'веса')
+    except ValueError as e:
+        parser.error(str(e))
+
+    stub = None
+    urls = None
+    if args.stub:
+        from stub_server import StubServer
+        stub = StubServer().start()
+        stub.add_weather_sources()
+        urls = stub.source_url_templates()
+        print(f"Тестовый сервер: {stub.base_url}")
+
+    weather_parser = WeatherParser(urls=urls, cache_dir=args.cache_dir, metrics=Metrics() if args.metrics else None)
+    service = ForecastService(weather_parser, intervals, args.interval, args.jitter, args.method, weights)
+    server = ServiceServer(service, args.host, args.port).start()
+    print(f"Сервис запущен: {server.base_url}/forecast, /sources, /sources/<сайт>, /health"
+          + (", /metrics" if args.metrics else ""))
+
+    try:
+        server.thread.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        if stub:
+            stub.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,250 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+
+from forecast import TRUE_VALUES
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Все записи плоские и имеют одинаковый набор полей, поэтому подходят и для CSV, и для
+# колоночных форматов. type 'source' - день прогноза одного сайта, type 'day' - обработанный
+# день с усредненной температурой и анализом событий; ненужные для типа поля пустые.
+# fallback - у записи сайта: это тестовые данные вместо настоящих, у дня: в среднее вошли тестовые данные.
+RECORD_FIELDS = ('type', 'source', 'index', 'date', 'day_temp', 'night_temp', 'days_until_coldest',
+                 'total_words', 'words_with_a', 'words_with_o', 'original_text', 'shifted_text', 'fallback')
+
+FORMATS = ('jsonl', 'csv', 'parquet', 'arrow')
+
+EXTENSIONS = {'.jsonl': 'jsonl', '.json': 'jsonl', '.csv': 'csv', '.parquet': 'parquet', '.arrow': 'arrow'}
+
+
+def source_record(source, index, day):
+    # day - ForecastDay
+    return {'type': 'source', 'source': source, 'index': index, 'date': day.date,
+            'day_temp': day.day_temp, 'night_temp': day.night_temp, 'fallback': day.fallback}
+
+
+def day_record(index, result):
+    # result - DayResult
+    record = {'type': 'day', 'index': index}
+    record.update(result.to_dict())
+    return record
+
+
+def is_fallback(record):
+    return record.get('fallback') in TRUE_VALUES
+
+
+def detect_format(path, fmt=None):
+    if fmt:
+        return fmt
+    return EXTENSIONS.get(os.path.splitext(path)[1].lower(), 'jsonl')
+
+
+class RecordSink:
+    # Записи копятся в буфере и сбрасываются на диск каждые flush_every записей
+    # или раз в flush_interval секунд, поэтому при сбое теряется только хвост
+    def __init__(self, path, flush_every=64, flush_interval=1.0):
+        self.path = path
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.buffer = []
+        self.written = 0
+        self.last_flush = time.monotonic()
+
+    def write(self, record):
+        self.buffer.append(record)
+        if len(self.buffer) >= self.flush_every or time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.write_batch(self.buffer)
+            self.written += len(self.buffer)
+            self.buffer = []
+        self.last_flush = time.monotonic()
+
+    def write_batch(self, records):
+        raise NotImplementedError
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class JsonLinesSink(RecordSink):
+    def __init__(self, path, **kwargs):
+        super().__init__(path, **kwargs)
+        self.file = open(path, 'w', encoding='utf-8')
+
+    def write_batch(self, records):
+        self.file.write(''.join(json.dumps(record, ensure_ascii=False) + "\n" for record in records))
+        self.file.flush()
+
+    def close(self):
+        super().close()
+        self.file.close()
+
+
+class CsvSink(RecordSink):
+    def __init__(self, path, **kwargs):
+        super().__init__(path, **kwargs)
+        self.file = open(path, 'w', newline='', encoding='utf-8')
+        self.writer = csv.DictWriter(self.file, fieldnames=RECORD_FIELDS)
+        self.writer.writeheader()
+
+    def write_batch(self, records):
+        self.writer.writerows(records)
+        self.file.flush()
+
+    def close(self):
+        super().close()
+        self.file.close()
+
+
+class ArrowSink(RecordSink):
+    # Каждый сброс буфера - отдельная группа строк Parquet или пакет потока Arrow IPC.
+    # Поток Arrow читается и после сбоя, а у Parquet метаданные пишутся только в close().
+    def __init__(self, path, fmt='parquet', flush_every=1024, **kwargs):
+        if pyarrow is None:
+            raise RuntimeError("Для форматов parquet и arrow нужен пакет pyarrow")
+        super().__init__(path, flush_every=flush_every, **kwargs)
+        self.schema = pyarrow.schema([
+            ('type', pyarrow.string()), ('source', pyarrow.string()), ('index', pyarrow.int32()),
+            ('date', pyarrow.string()), ('day_temp', pyarrow.float64()), ('night_temp', pyarrow.float64()),
+            ('days_until_coldest', pyarrow.int32()), ('total_words', pyarrow.int32()),
+            ('words_with_a', pyarrow.int32()), ('words_with_o', pyarrow.int32()),
+            ('original_text', pyarrow.string()), ('shifted_text', pyarrow.string()),
+            ('fallback', pyarrow.bool_()),
+        ])
+        if fmt == 'parquet':
+            self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+        else:
+            self.writer = pyarrow.ipc.new_stream(path, self.schema)
+
+    def write_batch(self, records):
+        columns = {field: [record.get(field) for record in records] for field in RECORD_FIELDS}
+        self.writer.write_table(pyarrow.Table.from_pydict(columns, schema=self.schema))
+
+    def close(self):
+        super().close()
+        self.writer.close()
+
+
+def open_sink(path, fmt=None, **kwargs):
+    fmt = detect_format(path, fmt)
+    if fmt == 'jsonl':
+        return JsonLinesSink(path, **kwargs)
+    if fmt == 'csv':
+        return CsvSink(path, **kwargs)
+    if fmt in ('parquet', 'arrow'):
+        return ArrowSink(path, fmt, **kwargs)
+    raise ValueError(f"Неизвестный формат вывода: {fmt}")
+
+
+def read_records(path, fmt=None):
+    fmt = detect_format(path, fmt)
+    if fmt == 'jsonl':
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    elif fmt == 'csv':
+        with open(path, newline='', encoding='utf-8') as f:
+            yield from csv.DictReader(f)
+    elif fmt in ('parquet', 'arrow'):
+        if pyarrow is None:
+            raise RuntimeError("Для форматов parquet и arrow нужен пакет pyarrow")
+        if fmt == 'parquet':
+            batches = pyarrow.parquet.ParquetFile(path).iter_batches()
+        else:
+            batches = pyarrow.ipc.open_stream(path)
+        for batch in batches:
+            yield from batch.to_pylist()
+    else:
+        raise ValueError(f"Неизвестный формат вывода: {fmt}")
+
+
+def render_text_report(records, f, source_titles):
+    # Дни сайтов (не больше 7 на сайт) собираются до первого обработанного дня, потому что
+    # в отчете сайты идут в фиксированном порядке; обработанные дни пишутся сразу по мере чтения.
+    # В CSV все значения - строки, поэтому числа приводятся к типу явно.
+    source_days = {source: [] for source in source_titles}
+    days_started = False
+
+    def write_sources():
+        f.write("РЕЗУЛЬТАТЫ\n")
+        f.write("=" * 80 + "\n\n")
+
+        for source, title in source_titles.items():
+            days = sorted(source_days[source])[:7]
+            marker = " (ТЕСТОВЫЕ ДАННЫЕ: сайт недоступен)" if any(is_fallback(day) for _, day in days) else ""
+            f.write(f"ДАННЫЕ С {title.upper()}:{marker}\n")
+            for index, day in days:
+                f.write(f"День {index + 1}: {day['date']} - днем {int(day['day_temp'])}°C, "
+                        f"ночью {int(day['night_temp'])}°C\n")
+            f.write("\n")
+        f.write("=" * 80 + "\n\n")
+
+        f.write("ОБРАБОТАННЫЕ РЕЗУЛЬТАТЫ:\n")
+        f.write("=" * 80 + "\n\n")
+
+    for record in records:
+        if record['type'] == 'source':
+            if record['source'] in source_days:
+                source_days[record['source']].append((int(record['index']), record))
+            continue
+
+        if not days_started:
+            write_sources()
+            days_started = True
+
+        f.write(f"Дата: {record['date']}\n")
+        marker = " (с тестовыми данными)" if is_fallback(record) else ""
+        f.write(f"Средняя температура: днем {float(record['day_temp'])}°C, ночью {float(record['night_temp'])}°C{marker}\n")
+        f.write(f"До самого холодного дня: {record['days_until_coldest']} суток\n")
+        f.write(f"Всего слов: {record['total_words']}\n")
+        f.write(f"Слов с буквой 'а': {record['words_with_a']}\n")
+        f.write(f"Слов с буквой 'о': {record['words_with_o']}\n")
+        f.write(f"Оригинальный текст: {record['original_text']}\n")
+        f.write(f"Текст со сдвигом: {record['shifted_text']}\n")
+        f.write("=" * 80 + "\n\n")
+
+    if not days_started:
+        write_sources()
+
+
+def main(argv=None):
+    from sources import SOURCE_SPECS
+
+    parser = argparse.ArgumentParser(description="Текстовый отчет по сохраненным записям прогноза")
+    parser.add_argument('records', help="файл записей (jsonl, csv, parquet или arrow)")
+    parser.add_argument('--format', choices=FORMATS, help="формат файла (по умолчанию по расширению)")
+    parser.add_argument('-o', '--output', help="файл отчета (по умолчанию стандартный вывод)")
+    args = parser.parse_args(argv)
+
+    source_titles = {source: spec['title'] for source, spec in SOURCE_SPECS.items()}
+    records = read_records(args.records, args.format)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            render_text_report(records, f, source_titles)
+    else:
+        render_text_report(records, sys.stdout, source_titles)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,393 @@
+import re
+from html.parser import HTMLParser
+
+from bs4 import SoupStrainer
+
+from forecast import ForecastDay, UNKNOWN_DATE
+
+# Описание сайтов с прогнозом. Чтобы добавить сайт, достаточно добавить сюда запись.
+#
+# layout 'rows' - каждый день прогноза в отдельном контейнере container, внутри которого
+# первые элементы date, day и night дают дату, дневную и ночную температуру.
+# layout 'columns' - даты и температуры лежат в отдельных строках-контейнерах:
+# из occurrence-го контейнера берется каждый step-й элемент item.
+# В url подставляется location - идентификатор города на сайте (по умолчанию Москва),
+# и location_id - последняя часть location.
+SOURCE_SPECS = {
+    'yandex': {
+        'title': "Яндекс Погода",
+        'name': "Яндекс",
+        'url': "https://yandex.ru/pogoda/{location}/details",
+        'location': "moscow",
+        'layout': 'rows',
+        'container': 'div.forecast-briefly__day',
+        'date': 'time.forecast-briefly__date',
+        'day': 'span.temp__value_temp-max',
+        'night': 'span.temp__value_temp-min',
+        'day_pattern': 'temperature',
+        'night_pattern': 'temperature',
+    },
+    'world_weather': {
+        'title': "World-Weather",
+        'name': "World-Weather",
+        'url': "https://world-weather.ru/pogoda/{location}/7days",
+        'location': "russia/domodedovo",
+        'layout': 'rows',
+        'container': 'div.weather-short',
+        'date': 'div.dates.short-d',
+        'day': 'tr.day td.weather-temperature span',
+        'night': 'tr.night td.weather-temperature span',
+        'day_pattern': 'temperature',
+        'night_pattern': 'temperature',
+    },
+    'gismeteo': {
+        'title': "Gismeteo",
+        'name': "Gismeteo",
+        'url': "https://www.gismeteo.ru/{location}/10-days/",
+        'location': "weather-moscow-4368",
+        'layout': 'columns',
+        'min_days': 7,
+        'date': {'container': 'div.widget-row.widget-row-days', 'item': 'div.row-item'},
+        'day': {'container': 'div.widget-row-chart.widget-row-chart-temperature', 'occurrence': 0,
+                'item': 'span.unit.unit_temperature_c', 'step': 2},
+        'night': {'container': 'div.widget-row-chart.widget-row-chart-temperature', 'occurrence': 1,
+                  'item': 'span.unit.unit_temperature_c', 'step': 2},
+        'day_pattern': 'temperature',
+        'night_pattern': 'temperature',
+    },
+    'accuweather': {
+        'title': "AccuWeather",
+        'name': "AccuWeather",
+        'url': "https://www.accuweather.com/ru/{location}/daily-weather-forecast/{location_id}",
+        'location': "ru/moscow/294021",
+        'layout': 'rows',
+        'container': 'div.daily-wrapper',
+        'date': 'span.module-header.sub.date',
+        'day': 'span.high',
+        'night': 'span.low',
+        'day_pattern': 'temperature',
+        'night_pattern': 'accu_night',
+    },
+}
+
+# Регулярные выражения пробуются по порядку, берется первое совпадение
+TEMPERATURE_PATTERNS = {
+    'temperature': [re.compile(r'([+-]?\d+)')],
+    'accu_night': [re.compile(r'/([+-]?\d+)'), re.compile(r'([+-]?\d+)')],
+}
+
+FIELDS = ('date', 'day', 'night')
+# <meta charset="..."> или <meta http-equiv="Content-Type" content="...; charset=..."> в начале страницы
+META_CHARSET_PATTERN = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?([\w.:-]+)', re.IGNORECASE)
+META_SEARCH_BYTES = 4096
+
+VOID_ELEMENTS = frozenset(['area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input',
+                           'link', 'meta', 'param', 'source', 'track', 'wbr'])
+
+
+def format_url(template, location):
+    return template.format(location=location, location_id=location.rsplit('/', 1)[-1])
+
+
+def source_url(source, location=None):
+    spec = SOURCE_SPECS[source]
+    return format_url(spec['url'], location or spec['location'])
+
+
+def compile_selector(selector):
+    steps = []
+    for part in selector.split():
+        tag, *classes = part.split('.')
+        steps.append((tag or None, frozenset(classes)))
+    return tuple(steps)
+
+
+def step_matches(step, tag, classes):
+    name, required = step
+    return (name is None or name == tag) and required <= classes
+
+
+def parse_temperature(text, patterns):
+    for pattern in patterns:
+        match = pattern.search(text)
+        if match:
+            return int(match.group(1))
+    return None
+
+
+def decode_page(content, declared=None, guess=None):
+    # Кодировка как у браузера: charset из заголовка, затем <meta charset>, затем utf-8 и
+    # guess() - догадка по содержимому (windows-1251 у сайтов, не объявивших кодировку).
+    # Замена битых байт на U+FFFD - только если не подошло ничего
+    match = META_CHARSET_PATTERN.search(content, 0, META_SEARCH_BYTES)
+    meta = match.group(1).decode('ascii') if match else None
+    for encoding in (declared, meta, 'utf-8', guess):
+        if callable(encoding):
+            encoding = encoding()
+        if not encoding:
+            continue
+        try:
+            return content.decode(encoding)
+        except (LookupError, UnicodeDecodeError):
+            pass
+    return content.decode('utf-8', errors='replace')
+
+
+class StopExtraction(Exception):
+    pass
+
+
+class ExtractionPlan:
+    def __init__(self, spec, days=7):
+        self.spec = spec
+        self.layout = spec.get('layout', 'rows')
+        self.days = days
+        self.min_days = spec.get('min_days', 0)
+        self.patterns = {
+            'day': TEMPERATURE_PATTERNS[spec.get('day_pattern', 'temperature')],
+            'night': TEMPERATURE_PATTERNS[spec.get('night_pattern', 'temperature')],
+        }
+
+        if self.layout == 'rows':
+            self.container = compile_selector(spec['container'])
+            self.fields = [compile_selector(spec[field]) for field in FIELDS]
+            self.container_selectors = [spec['container']]
+        else:
+            self.columns = [spec[field] for field in FIELDS]
+            self.container_selectors = list(dict.fromkeys(column['container'] for column in self.columns))
+            self.containers = [compile_selector(selector) for selector in self.container_selectors]
+            self.column_plans = [
+                (self.container_selectors.index(column['container']), column.get('occurrence', 0),
+                 compile_selector(column['item']))
+                for column in self.columns
+            ]
+
+        self.soup_strainer = self.make_strainer()
+
+    def make_strainer(self):
+        steps = [compile_selector(selector)[0] for selector in self.container_selectors]
+        tags = {tag for tag, _ in steps}
+
+        def classes_match(value):
+            if not value:
+                return False
+            classes = frozenset(value.split() if isinstance(value, str) else value)
+            return any(required <= classes for _, required in steps)
+
+        return SoupStrainer(tags if None not in tags else None, class_=classes_match)
+
+    def extract(self, content):
+        if isinstance(content, bytes):
+            content = decode_page(content)
+
+        extractor = RowExtractor(self) if self.layout == 'rows' else ColumnExtractor(self)
+        try:
+            extractor.feed(content)
+            extractor.close()
+        except StopExtraction:
+            pass
+        return self.to_days(extractor.result())
+
+    def extract_soup(self, soup):
+        if self.layout == 'rows':
+            rows = []
+            for container in soup.select(self.spec['container'])[:self.days]:
+                row = {}
+                for field in FIELDS:
+                    element = container.select_one(self.spec[field])
+                    row[field] = element.get_text(strip=True) if element is not None else None
+                rows.append(row)
+            return self.to_days(rows)
+
+        columns = []
+        for column in self.columns:
+            containers = soup.select(column['container'])
+            occurrence = column.get('occurrence', 0)
+            items = containers[occurrence].select(column['item']) if occurrence < len(containers) else []
+            columns.append([item.get_text(strip=True) for item in items])
+        return self.to_days(self.columns_to_rows(columns))
+
+    def columns_to_rows(self, columns):
+        dates = columns[0]
+        if len(dates) < self.min_days:
+            return []
+
+        values = [column[::spec.get('step', 1)] for column, spec in zip(columns[1:], self.columns[1:])]
+        rows = []
+        for i in range(min(self.days, len(dates))):
+            row = {'date': dates[i]}
+            for field, column in zip(FIELDS[1:], values):
+                row[field] = column[i] if i < len(column) else None
+            rows.append(row)
+        return rows
+
+    def to_days(self, rows):
+        days_data = []
+        for row in rows[:self.days]:
+            date_text = row.get('date')
+            day_text = row.get('day')
+            night_text = row.get('night')
+
+            day_temp = parse_temperature(day_text, self.patterns['day']) if day_text else None
+            night_temp = parse_temperature(night_text, self.patterns['night']) if night_text else None
+
+            if day_temp is not None and night_temp is not None:
+                days_data.append(ForecastDay(date_text if date_text is not None else UNKNOWN_DATE, day_temp, night_temp))
+        return days_data
+
+
+class StreamExtractor(HTMLParser):
+    def __init__(self, plan):
+        super().__init__(convert_charrefs=True)
+        self.plan = plan
+        self.stack = []
+        self.captures = {}
+
+    @staticmethod
+    def classes_of(attrs):
+        for name, value in attrs:
+            if name == 'class' and value:
+                return frozenset(value.split())
+        return frozenset()
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_ELEMENTS:
+            self.handle_endtag(tag)
+
+    def handle_data(self, data):
+        if self.captures:
+            text = data.strip()
+            if text:
+                for pieces in self.captures.values():
+                    pieces[1].append(text)
+
+    def handle_endtag(self, tag):
+        if tag in VOID_ELEMENTS:
+            return
+
+        for i in range(len(self.stack) - 1, -1, -1):
+            if self.stack[i][0] == tag:
+                break
+        else:
+            return
+
+        while len(self.stack) > i:
+            frame = self.stack.pop()
+            depth = len(self.stack)
+            for key, (capture_depth, pieces) in list(self.captures.items()):
+                if capture_depth == depth:
+                    del self.captures[key]
+                    self.captured(key, ''.join(pieces))
+            self.closed(depth, frame)
+
+    def captured(self, key, text):
+        raise NotImplementedError
+
+    def closed(self, depth, frame):
+        pass
+
+
+class RowExtractor(StreamExtractor):
+    def __init__(self, plan):
+        super().__init__(plan)
+        self.rows = []
+        self.row = None
+        self.row_depth = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag in VOID_ELEMENTS:
+            return
+
+        classes = self.classes_of(attrs)
+        depth = len(self.stack)
+
+        if self.row is None:
+            progress = None
+            if step_matches(self.plan.container[0], tag, classes):
+                self.row = {}
+                self.row_depth = depth
+                progress = (0,) * len(FIELDS)
+        else:
+            # progress[i] - сколько шагов селектора поля i уже совпало на пути от контейнера
+            progress = list(self.stack[-1][1])
+            for i, chain in enumerate(self.plan.fields):
+                matched = progress[i]
+                if matched < len(chain) and step_matches(chain[matched], tag, classes):
+                    progress[i] = matched + 1
+                    field = FIELDS[i]
+                    if progress[i] == len(chain) and field not in self.row and field not in self.captures:
+                        self.captures[field] = (depth, [])
+            progress = tuple(progress)
+
+        self.stack.append((tag, progress))
+
+    def captured(self, key, text):
+        if self.row is not None:
+            self.row[key] = text
+
+    def closed(self, depth, frame):
+        if self.row is not None and depth == self.row_depth:
+            self.rows.append(self.row)
+            self.row = None
+            if len(self.rows) >= self.plan.days:
+                raise StopExtraction()
+
+    def result(self):
+        return self.rows
+
+
+class ColumnExtractor(StreamExtractor):
+    def __init__(self, plan):
+        super().__init__(plan)
+        self.occurrences = [0] * len(plan.containers)
+        self.values = [[] for _ in plan.column_plans]
+        self.finished = set()
+
+    def handle_starttag(self, tag, attrs):
+        if tag in VOID_ELEMENTS:
+            return
+
+        classes = self.classes_of(attrs)
+        depth = len(self.stack)
+        parent_open, parent_active = self.stack[-1][1][:2] if self.stack else (frozenset(), ())
+
+        active = []
+        for column, matched in parent_active:
+            chain = self.plan.column_plans[column][2]
+            if matched < len(chain) and step_matches(chain[matched], tag, classes):
+                matched += 1
+                if matched == len(chain) and column not in self.captures:
+                    self.captures[column] = (depth, [])
+            active.append((column, matched))
+
+        opened = parent_open
+        started = []
+        for index, container in enumerate(self.plan.containers):
+            if index in parent_open or not step_matches(container[0], tag, classes):
+                continue
+            opened = opened | {index}
+            occurrence = self.occurrences[index]
+            self.occurrences[index] += 1
+            for column, (container_index, wanted, _) in enumerate(self.plan.column_plans):
+                if container_index == index and wanted == occurrence:
+                    active.append((column, 0))
+                    started.append(column)
+
+        self.stack.append((tag, (opened, tuple(active), started)))
+
+    def closed(self, depth, frame):
+        started = frame[1][2]
+        if started:
+            self.finished.update(started)
+            if len(self.finished) == len(self.plan.column_plans):
+                raise StopExtraction()
+
+    def captured(self, key, text):
+        self.values[key].append(text)
+
+    def result(self):
+        return self.plan.columns_to_rows(self.values)
+
+
+SOURCE_PLANS = {source: ExtractionPlan(spec) for source, spec in SOURCE_SPECS.items()}
@@ -0,0 +1,225 @@
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import parse_qs
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+SOURCE_FIXTURES = {
+    'yandex': 'yandex.html',
+    'world_weather': 'world_weather.html',
+    'gismeteo': 'gismeteo.html',
+    'accuweather': 'accuweather.html',
+}
+
+WIKIPEDIA_FIXTURE = 'wikipedia.html'
+WIKITEXT_FIXTURE = 'wikipedia.wikitext'
+
+ENGLISH_MONTHS = ['January', 'February', 'March', 'April', 'May', 'June', 'July',
+                  'August', 'September', 'October', 'November', 'December']
+RUSSIAN_MONTHS = ['января', 'февраля', 'марта', 'апреля', 'мая', 'июня', 'июля',
+                  'августа', 'сентября', 'октября', 'ноября', 'декабря']
+
+API_MAX_TITLES = 50
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Ответ уходит одним пакетом, чтобы отложенное подтверждение TCP не добавляло
+    # к каждому запросу лишние 40 мс и не искажало замеры задержек
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        path, _, query = self.path.partition('?')
+        route = self.server.routes.get(path)
+        if route is None:
+            route = next((route for prefix, route in self.server.prefix_routes if path.startswith(prefix)), None)
+        if route is None:
+            self.send_error(404)
+            return
+
+        body, delay, content_type = route
+        faults = self.server.faults
+        if faults['jitter']:
+            delay += faults['random'].uniform(0, faults['jitter'])
+        if delay:
+            time.sleep(delay)
+
+        self.server.request_count += 1
+        if faults['error_rate'] and faults['random'].random() < faults['error_rate']:
+            self.server.error_count += 1
+            self.send_error(faults['error_status'])
+            return
+
+        if callable(body):
+            body = body(query)
+
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # Клиент не дождался ответа (бюджет сайта или повторный запрос уже ответил)
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+def api_query(pages, query, max_bytes):
+    params = {name: values[0] for name, values in parse_qs(query).items()}
+    if params.get('action') != 'query' or params.get('prop') != 'revisions':
+        return json.dumps({'error': {'code': 'badvalue', 'info': "Поддерживается только action=query&prop=revisions"}},
+                          ensure_ascii=False).encode('utf-8')
+
+    titles = list(dict.fromkeys(filter(None, params.get('titles', '').split('|'))))
+    data = {}
+    if len(titles) > API_MAX_TITLES:
+        data['warnings'] = {'main': {'warnings': f'Too many values supplied for parameter "titles". '
+                                                 f'The limit is {API_MAX_TITLES}.'}}
+        titles = titles[:API_MAX_TITLES]
+
+    start = int(params.get('rvcontinue', 0))
+    size = 0
+    result = []
+    for i, title in enumerate(titles):
+        content = pages.get(title)
+        if content is None:
+            result.append({'ns': 0, 'title': title, 'missing': True})
+            continue
+        page = {'pageid': i + 1, 'ns': 0, 'title': title}
+        if i >= start and 'continue' not in data:
+            if size and size + len(content) > max_bytes:
+                data['continue'] = {'rvcontinue': str(i), 'continue': '||'}
+            else:
+                page['revisions'] = [{'slots': {'main': {'contentmodel': 'wikitext', 'contentformat': 'text/x-wiki',
+                                                         'content': content}}}]
+                size += len(content)
+        result.append(page)
+
+    if 'continue' not in data:
+        data['batchcomplete'] = True
+    data['query'] = {'pages': result}
+    return json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+
+class StubServer:
+    def __init__(self, host='127.0.0.1', port=0):
+        self.httpd = ThreadingHTTPServer((host, port), StubHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.routes = {}
+        self.httpd.prefix_routes = []
+        self.httpd.request_count = 0
+        self.httpd.error_count = 0
+        self.set_faults()
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def set_faults(self, error_rate=0.0, error_status=503, jitter=0.0, seed=None):
+        # Для всех маршрутов: доля ответов с ошибкой error_status и случайная добавка
+        # к задержке от 0 до jitter секунд
+        self.httpd.faults = {
+            'error_rate': error_rate,
+            'error_status': error_status,
+            'jitter': jitter,
+            'random': random.Random(seed),
+        }
+
+    def add_route(self, path, body, delay=0.0, content_type='text/html; charset=utf-8'):
+        # body - байты или функция от строки запроса, которая возвращает байты
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.httpd.routes[path] = (body, delay, content_type)
+
+    def add_prefix_route(self, prefix, body, delay=0.0):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.httpd.prefix_routes.append((prefix, (body, delay, 'text/html; charset=utf-8')))
+
+    def add_fixture(self, path, filename, delay=0.0):
+        with open(os.path.join(FIXTURES_DIR, filename), 'rb') as f:
+            self.add_route(path, f.read(), delay)
+
+    def add_weather_sources(self, delay=0.0):
+        for source, filename in SOURCE_FIXTURES.items():
+            self.add_fixture(f"/{source}", filename, delay)
+            self.add_prefix_route(f"/{source}/", self.httpd.routes[f"/{source}"][0], delay)
+
+    def add_wikipedia_pages(self, delay=0.0):
+        with open(os.path.join(FIXTURES_DIR, WIKIPEDIA_FIXTURE), 'rb') as f:
+            body = f.read()
+        for month in ENGLISH_MONTHS:
+            for day in range(1, 32):
+                self.add_route(f"/wiki/{month}_{day}", body, delay)
+
+    def add_wikipedia_api(self, delay=0.0, max_bytes=12 * 1024 * 1024):
+        # /w/api.php с action=query&prop=revisions для статей "1 января" ... "31 декабря".
+        # Как и настоящий API, берет не больше 50 названий, а если тексты не помещаются в
+        # max_bytes, отдает часть и continue с номером следующей статьи в rvcontinue
+        with open(os.path.join(FIXTURES_DIR, WIKITEXT_FIXTURE), encoding='utf-8') as f:
+            wikitext = f.read()
+        pages = {f"{day} {month}": wikitext for month in RUSSIAN_MONTHS for day in range(1, 32)}
+        self.add_route('/w/api.php', lambda query: api_query(pages, query, max_bytes), delay,
+                       'application/json; charset=utf-8')
+
+    def source_urls(self):
+        return {source: f"{self.base_url}/{source}" for source in SOURCE_FIXTURES}
+
+    def source_url_templates(self):
+        return {source: f"{self.base_url}/{source}/{{location}}" for source in SOURCE_FIXTURES}
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8000
+    delay = float(sys.argv[2]) if len(sys.argv) > 2 else 0.0
+    error_rate = float(sys.argv[3]) if len(sys.argv) > 3 else 0.0
+
+    server = StubServer(port=port)
+    server.set_faults(error_rate=error_rate)
+    server.add_weather_sources(delay)
+    server.add_wikipedia_pages(delay)
+    server.add_wikipedia_api(delay)
+    print(f"Тестовый сервер запущен: {server.base_url} (задержка {delay} с, доля ошибок {error_rate})")
+    for source, url in server.source_urls().items():
+        print(f"  {source}: {url}")
+    print(f"  wikipedia: {server.base_url}/wiki")
+    print(f"  wikipedia api: {server.base_url}/w/api.php")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
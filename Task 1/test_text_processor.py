@@ -0,0 +1,90 @@
+import random
+import re
+import unittest
+
+from Weather import TextProcessor
+
+
+def baseline_shift_words(text):
+    # Прежняя реализация shift_words (до линейного алгоритма) без изменений - эталон для сравнения
+    tokens = re.findall(r'(\b[а-яё]+\b|\S+)', text, re.IGNORECASE)
+    words_with_positions = []
+
+    for i, token in enumerate(tokens):
+        if re.match(r'^\b[а-яё]+\b$', token, re.IGNORECASE):
+            if 'а' in token.lower():
+                words_with_positions.append(('a', token, i))
+            elif 'о' in token.lower():
+                words_with_positions.append(('o', token, i))
+
+    result_tokens = tokens.copy()
+
+    for letter_type, word, original_pos in words_with_positions:
+        if letter_type == 'a':
+            new_pos = max(0, original_pos - 1)
+        else:
+            new_pos = max(0, original_pos - 3)
+
+        if original_pos < len(result_tokens) and result_tokens[original_pos] == word:
+            current_pos = result_tokens.index(word) if word in result_tokens[original_pos:original_pos + 1] else -1
+            if current_pos != -1:
+                result_tokens.pop(current_pos)
+                result_tokens.insert(new_pos, word)
+
+    return ' '.join(result_tokens)
+
+
+# Небольшой словарь, чтобы слова часто повторялись: именно повторы проверяют выбор
+# первого вхождения. Есть слова с "а", с "о", с обеими буквами и без них, разный регистр,
+# "ё", латиница, числа, знаки препинания и символы вне русского алфавита.
+VOCABULARY = [
+    'мама', 'Мама', 'МАМА', 'кот', 'Кот', 'дом', 'сад', 'окно', 'сова', 'лес', 'ёж', 'Ёлка', 'мир',
+    'и', 'а', 'о', 'в', 'жук', 'cat', 'dog', 'Moscow', '1812', '—', ',', '.', '!', '...',
+    'кот,', '(мама)', 'слово-слово', 'ſ', 'ﬁ', 'é', 'наивный́', '🙂', 'год:', '«сова»',
+]
+SEPARATORS = [' ', ' ', ' ', '  ', '\n', '\t', ', ', '. ', '—']
+
+
+def random_text(rng, max_tokens=40):
+    parts = []
+    for _ in range(rng.randint(0, max_tokens)):
+        parts.append(rng.choice(VOCABULARY))
+        parts.append(rng.choice(SEPARATORS))
+    return ''.join(parts)
+
+
+class ShiftWordsTest(unittest.TestCase):
+    def assert_same(self, text):
+        self.assertEqual(TextProcessor.shift_words(text), baseline_shift_words(text), repr(text))
+        self.assertEqual(TextProcessor.analyze(text)['shifted_text'], baseline_shift_words(text), repr(text))
+
+    def test_empty_and_blank(self):
+        for text in ('', ' ', '\n\t ', '   '):
+            self.assert_same(text)
+
+    def test_punctuation(self):
+        for text in ('—', '... , !', 'кот, кот. Кот! (кот)', 'мама,мама;мама', '«сова» - сова — сова'):
+            self.assert_same(text)
+
+    def test_unicode(self):
+        for text in ('ёж Ёж ЁЖ ёжик', 'ſ ﬁ é наивный́ 🙂 мама', 'Москва Moscow мама MAMA',
+                     'о а о а о а', 'окно окно окно окно сад сад'):
+            self.assert_same(text)
+
+    def test_repeated_words(self):
+        self.assert_same(' '.join(['мама', 'кот'] * 50))
+        self.assert_same(' '.join(['дом'] * 30 + ['мама'] * 30))
+
+    def test_random_texts(self):
+        rng = random.Random(20261018)
+        for _ in range(3000):
+            self.assert_same(random_text(rng))
+
+    def test_batch_matches_single(self):
+        rng = random.Random(1)
+        texts = [random_text(rng) for _ in range(50)]
+        self.assertEqual(TextProcessor.shift_words_batch(texts), [baseline_shift_words(text) for text in texts])
+
+
+if __name__ == '__main__':
+    unittest.main()
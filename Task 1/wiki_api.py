@@ -0,0 +1,220 @@
+import argparse
+import html
+import json
+import re
+import sys
+import time
+from urllib.parse import urlencode
+
+import requests
+
+API_PATH = '/w/api.php'
+# Больше 50 названий в одном запросе API принимает только от ботов
+MAX_TITLES = 50
+EVENTS_HEADING = 'события'
+
+HEADING_PATTERN = re.compile(r'^(={2,6})\s*(.*?)\s*\1\s*$', re.MULTILINE)
+COMMENT_PATTERN = re.compile(r'<!--.*?-->', re.DOTALL)
+REF_PATTERN = re.compile(r'<ref[^>]*/>|<ref[^>]*>.*?</ref>', re.DOTALL | re.IGNORECASE)
+TEMPLATE_PATTERN = re.compile(r'\{\{([^{}]*)\}\}')
+FILE_LINK_PATTERN = re.compile(r'\[\[(?:Файл|File|Изображение|Image|Категория|Category):[^\[\]]*\]\]', re.IGNORECASE)
+LINK_PATTERN = re.compile(r'\[\[(?:[^|\[\]]*\|)?([^\[\]]*)\]\]')
+EXTERNAL_LINK_PATTERN = re.compile(r'\[(?:https?:)?//[^\s\]]+\s*([^\]]*)\]')
+TAG_PATTERN = re.compile(r'<[^>]+>')
+QUOTES_PATTERN = re.compile(r"'{2,}")
+SPACES_PATTERN = re.compile(r'\s+')
+YEAR_PATTERN = re.compile(r'\d{4}')
+
+# Шаблоны, которые в статье выводятся текстом первого параметра; остальные
+# (сноски, оформление, «См. также») при разборе выбрасываются
+INLINE_TEMPLATES = {'нп', 'нп1', 'нп2', 'нп3', 'нп4', 'нп5', 'не переведено', 'nobr', 's', 'iw'}
+
+
+class WikiApiError(Exception):
+    pass
+
+
+def api_url(wiki_url):
+    # https://ru.wikipedia.org/wiki -> https://ru.wikipedia.org/w/api.php
+    wiki_url = wiki_url.rstrip('/')
+    if wiki_url.endswith('/wiki'):
+        wiki_url = wiki_url[:-len('/wiki')]
+    return wiki_url + API_PATH
+
+
+def page_title(day, month_name):
+    # Статьи о датах в русской Википедии называются "13 октября"
+    return f"{int(day)} {month_name.lower()}"
+
+
+def inline_template(match):
+    name, _, params = match.group(1).partition('|')
+    name = name.strip().lower()
+    if name in INLINE_TEMPLATES or name.startswith('lang-'):
+        return params.split('|', 1)[0]
+    return ''
+
+
+def strip_blocks(text):
+    # Комментарии, сноски и шаблоны могут занимать несколько строк, поэтому убираются
+    # до разбиения текста на строки
+    text = COMMENT_PATTERN.sub('', text)
+    text = REF_PATTERN.sub('', text)
+    while True:
+        text, count = TEMPLATE_PATTERN.subn(inline_template, text)
+        if not count:
+            return text
+
+
+def strip_wikitext(text):
+    # Разметка вики-текста -> обычный текст, как его видит читатель страницы
+    text = strip_blocks(text)
+    text = FILE_LINK_PATTERN.sub('', text)
+    text = LINK_PATTERN.sub(r'\1', text)
+    text = EXTERNAL_LINK_PATTERN.sub(r'\1', text)
+    text = TAG_PATTERN.sub('', text)
+    text = QUOTES_PATTERN.sub('', text)
+    return SPACES_PATTERN.sub(' ', html.unescape(text)).strip()
+
+
+def events_section(wikitext):
+    # Текст раздела "События" вместе с подразделами или None, если раздела нет
+    start = level = None
+    for match in HEADING_PATTERN.finditer(wikitext):
+        if start is None:
+            if EVENTS_HEADING in strip_wikitext(match.group(2)).lower():
+                start, level = match.end(), len(match.group(1))
+        elif len(match.group(1)) <= level:
+            return wikitext[start:match.start()]
+    return wikitext[start:] if start is not None else None
+
+
+def blocks(wikitext):
+    # (пункт списка или абзац, текст) в порядке страницы. Вложенные пункты под годом
+    # без текста ("* 1812:") получают год в начало
+    parent = None
+    for line in strip_blocks(wikitext).splitlines():
+        line = line.strip()
+        marker = len(line) - len(line.lstrip('*#'))
+        if not marker:
+            parent = None
+            if line and line[0] not in '=:;|{}!':
+                yield 'paragraph', strip_wikitext(line)
+            continue
+        text = strip_wikitext(line[marker:])
+        if marker == 1:
+            parent = text[:-1] if text.endswith(':') else None
+            if parent is None:
+                yield 'item', text
+        else:
+            yield 'item', f"{parent} — {text}" if parent else text
+
+
+def extract_events(wikitext):
+    # Тот же отбор, что у extract_wikipedia_events для HTML: пункты списков раздела
+    # "События" длиннее 10 символов и абзацы длиннее 20, а если раздела нет - пункты
+    # всех списков страницы с годом
+    section = events_section(wikitext)
+    if section is not None:
+        events = [text for kind, text in blocks(section)
+                  if len(text) > 10 and (kind == 'item' or len(text) > 20 and not text.startswith('['))]
+        if events:
+            return events
+
+    return [text for kind, text in blocks(wikitext)
+            if kind == 'item' and len(text) > 30 and YEAR_PATTERN.search(text)]
+
+
+class WikiApiClient:
+    # Вики-текст нескольких статей одним запросом action=query&prop=revisions. Вики-текст
+    # в несколько раз меньше готовой HTML-страницы (без оформления, навигации и шаблонов), а
+    # раздел из него вырезается регулярными выражениями без построения дерева документа.
+    # fetch(url) отдает ответ requests: WeatherParser передает сюда загрузку со своими
+    # бюджетами, кэшем, ограничением частоты и записью запуска.
+    def __init__(self, url, fetch, batch_size=MAX_TITLES):
+        self.url = url
+        self.fetch = fetch
+        self.batch_size = min(batch_size, MAX_TITLES)
+
+    def query_url(self, titles, continuation=None):
+        params = {
+            'action': 'query',
+            'format': 'json',
+            'formatversion': '2',
+            'prop': 'revisions',
+            'rvprop': 'content',
+            'rvslots': 'main',
+            'redirects': '1',
+            'titles': '|'.join(titles),
+        }
+        params.update(continuation or {})
+        return f"{self.url}?{urlencode(params)}"
+
+    def fetch_batch(self, titles):
+        aliases = {title: title for title in titles}
+        contents = {}
+        continuation = None
+        while True:
+            response = self.fetch(self.query_url(titles, continuation))
+            response.raise_for_status()
+            data = response.json()
+            if 'error' in data:
+                raise WikiApiError(f"{data['error'].get('code')}: {data['error'].get('info')}")
+
+            query = data.get('query', {})
+            # Сначала нормализация названий, потом перенаправления: запрошенное название
+            # проходит обе цепочки до статьи, в которой лежит текст
+            for item in query.get('normalized', []) + query.get('redirects', []):
+                for title, alias in aliases.items():
+                    if alias == item['from']:
+                        aliases[title] = item['to']
+            for page in query.get('pages', []):
+                if page.get('missing') or page.get('invalid'):
+                    contents[page['title']] = None
+                elif page.get('revisions'):
+                    contents[page['title']] = page['revisions'][0]['slots']['main']['content']
+
+            # Если ответ вышел бы слишком большим, API отдает часть текстов и continue
+            continuation = data.get('continue')
+            if not continuation:
+                break
+        return {title: contents.get(alias) for title, alias in aliases.items()}
+
+    def fetch_pages(self, titles):
+        # {название: вики-текст или None, если статьи нет}
+        titles = list(dict.fromkeys(titles))
+        pages = {}
+        for start in range(0, len(titles), self.batch_size):
+            pages.update(self.fetch_batch(titles[start:start + self.batch_size]))
+        return pages
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="События дат из Википедии через MediaWiki API")
+    parser.add_argument('dates', nargs='+', help="даты вида '13 октября'")
+    parser.add_argument('--wiki-url', default="https://ru.wikipedia.org/wiki", help="адрес Википедии")
+    parser.add_argument('--json', action='store_true', help="вывести события в JSON")
+    args = parser.parse_args(argv)
+
+    session = requests.Session()
+    client = WikiApiClient(api_url(args.wiki_url), lambda url: session.get(url, timeout=10))
+    started = time.perf_counter()
+    pages = client.fetch_pages(args.dates)
+    events = {title: extract_events(text) if text is not None else None for title, text in pages.items()}
+    elapsed = time.perf_counter() - started
+
+    if args.json:
+        json.dump(events, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+        return 0
+
+    for title, items in events.items():
+        print(f"{title}: " + ("статьи нет" if items is None else f"событий {len(items)}"))
+        for text in (items or [])[:3]:
+            print(f"  {text}")
+    print(f"Загружено за {elapsed:.2f} с")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
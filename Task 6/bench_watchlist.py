@@ -0,0 +1,141 @@
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+from watchlist import load_index, normalize_domain, normalize_phone
+
+TLDS = ('com', 'ru', 'net', 'org', 'info')
+
+
+def random_label(rng, low=4, high=12):
+    return ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz0123456789-') for _ in range(rng.randint(low, high))).strip('-') or 'x'
+
+
+def synthetic_watchlists(directory, domains, phones, substrings, suffixes, seed=0):
+    # Файлы списков в том виде, в каком их отдают фиды индикаторов: по одному в строке
+    rng = random.Random(seed)
+    lists = {
+        'domains': [f"{random_label(rng)}.{random_label(rng)}.{rng.choice(TLDS)}" for _ in range(domains)],
+        'phones': [f"79{rng.randrange(10 ** 9):09d}" for _ in range(phones)],
+        'substrings': [random_label(rng, 5, 8) for _ in range(substrings)],
+        'suffixes': [f"{random_label(rng)}.{rng.choice(TLDS)}" for _ in range(suffixes)],
+    }
+    paths = {}
+    for kind, items in lists.items():
+        path = os.path.join(directory, f"{kind}.txt")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write("\n".join(items) + "\n")
+        paths[kind] = [path]
+    return lists, paths
+
+
+def synthetic_lookups(lists, count, hit_rate=0.1, seed=1):
+    # Найденные сканером значения: доля hit_rate - индикаторы из списков, остальное - случайные
+    rng = random.Random(seed)
+    lookups = []
+    for _ in range(count):
+        if rng.random() < 0.5:
+            if rng.random() < hit_rate:
+                choice = rng.random()
+                if choice < 0.4:
+                    value = rng.choice(lists['domains'])
+                elif choice < 0.7:
+                    value = f"{random_label(rng)}.{rng.choice(lists['suffixes'])}"
+                else:
+                    value = f"{random_label(rng, 2, 4)}{rng.choice(lists['substrings'])}.{rng.choice(TLDS)}"
+            else:
+                value = f"{random_label(rng)}.{rng.choice(TLDS)}"
+            lookups.append(('domain', value))
+        else:
+            value = rng.choice(lists['phones']) if rng.random() < hit_rate else f"79{rng.randrange(10 ** 9):09d}"
+            lookups.append(('phone', value))
+    return lookups
+
+
+def naive_match(lists, kind, value):
+    # Исходный подход: списки строк и линейный перебор для каждого значения
+    if kind == 'phone':
+        return [('phone', value)] if value in lists['phones'] else []
+    hits = []
+    if value in lists['domains']:
+        hits.append(('domain', value))
+    hits += [('substring', item) for item in lists['substrings'] if item in value]
+    hits += [('suffix', item) for item in lists['suffixes'] if value == item or value.endswith('.' + item)]
+    return hits
+
+
+def rate(function, items):
+    started = time.perf_counter()
+    for kind, value in items:
+        function(kind, value)
+    return len(items) / (time.perf_counter() - started)
+
+
+def run(domains, phones, substrings, suffixes, lookups, naive_lookups, directory):
+    results = {'domains': domains, 'phones': phones, 'substrings': substrings, 'suffixes': suffixes}
+    lists, paths = synthetic_watchlists(directory, domains, phones, substrings, suffixes)
+    results['watchlist_mb'] = sum(os.path.getsize(path[0]) for path in paths.values()) / 2 ** 20
+
+    cache_dir = os.path.join(directory, 'cache')
+    started = time.perf_counter()
+    index, _ = load_index(paths, cache_dir)
+    results['build_s'] = time.perf_counter() - started
+    started = time.perf_counter()
+    cached, from_cache = load_index(paths, cache_dir)
+    results['cache_load_s'] = time.perf_counter() - started
+    assert from_cache
+    results['cache_mb'] = sum(os.path.getsize(os.path.join(cache_dir, name)) for name in os.listdir(cache_dir)) / 2 ** 20
+    results['array_mb'] = (index.domains.itemsize * len(index.domains) + index.phones.itemsize * len(index.phones)) / 2 ** 20
+    results['automaton_nodes'] = len(index.automaton.goto)
+
+    items = synthetic_lookups(lists, lookups)
+    results['index_lookups_per_s'] = rate(cached.match, items)
+
+    # Перебор списков в миллионы строк медленный, поэтому он меряется на малой выборке
+    # и сверяется с индексом на ней же
+    sample = items[:naive_lookups]
+    results['naive_lookups_per_s'] = rate(lambda kind, value: naive_match(lists, kind, value), sample)
+    results['speedup'] = results['index_lookups_per_s'] / results['naive_lookups_per_s']
+
+    for kind, value in sample:
+        expected = sorted(naive_match(lists, kind, normalize_domain(value) if kind == 'domain' else normalize_phone(value)))
+        if sorted(cached.match(kind, value)) != expected:
+            raise AssertionError(f"Индекс и перебор разошлись на {kind} {value}")
+    results['hits_in_sample'] = sum(bool(cached.match(kind, value)) for kind, value in sample)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Скорость проверки по спискам индикаторов: индекс против перебора")
+    parser.add_argument('--domains', type=int, default=1_000_000, help="точных доменов в списке")
+    parser.add_argument('--phones', type=int, default=1_000_000, help="телефонов в списке")
+    parser.add_argument('--substrings', type=int, default=1_000)
+    parser.add_argument('--suffixes', type=int, default=10_000)
+    parser.add_argument('--lookups', type=int, default=200_000, help="проверяемых значений")
+    parser.add_argument('--naive-lookups', type=int, default=200, help="значений для перебора")
+    parser.add_argument('--dir', help="каталог для списков и кэша (по умолчанию временный)")
+    parser.add_argument('--json', help="сохранить результаты в JSON-файл")
+    args = parser.parse_args(argv)
+
+    options = (args.domains, args.phones, args.substrings, args.suffixes, args.lookups, args.naive_lookups)
+    if args.dir:
+        results = run(*options, args.dir)
+    else:
+        with tempfile.TemporaryDirectory() as directory:
+            results = run(*options, directory)
+
+    for name, value in results.items():
+        print(f"{name:<24}{value:>16,.2f}" if isinstance(value, float) else f"{name:<24}{value:>16,}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,172 @@
+import argparse
+import heapq
+import mmap
+import os
+import re
+import sys
+from multiprocessing import Pool
+
+# Те же выражения, что в task6.py. Для видов из LINE_KINDS результатом считается вся
+# строка, в которой нашлось совпадение.
+PATTERNS = {
+    'domain': r'\b\w+\.(?:com|ru)\b',
+    'phone': r'\b[78]9?916\d{7}\b',
+    'png_line': r'16\.png',
+}
+LINE_KINDS = {'png_line'}
+
+CHUNK_SIZE = 4 << 20
+
+_patterns = None
+_line_kinds = None
+_maps = {}
+
+
+def compile_patterns(patterns):
+    # Выражения не объединяются в одно через |: альтернатива отдает текст первому
+    # совпавшему виду, и, например, в 79161234567.com терялся бы телефон внутри домена
+    return [(name, re.compile(pattern)) for name, pattern in patterns.items()]
+
+
+def tagged(index, name, pattern, text):
+    for match in pattern.finditer(text):
+        yield match.start(), index, match.end(), name, match
+
+
+def find_all(patterns, text):
+    # Совпадения каждого выражения по тому же куску текста, слитые по позиции; при равной
+    # позиции - в порядке выражений. Для каждого вида результат тот же, что у отдельного
+    # re.finditer по всему тексту
+    streams = [tagged(index, name, pattern, text) for index, (name, pattern) in enumerate(patterns)]
+    for _, _, _, name, match in heapq.merge(*streams):
+        yield name, match
+
+
+def plan_chunks(path, chunk_size=CHUNK_SIZE):
+    # Границы кусков сдвигаются на конец строки. Ни одно выражение не переходит через
+    # перевод строки, поэтому совпадения на стыке кусков не теряются и не дублируются,
+    # а куски можно разбирать независимо. Строка длиннее куска целиком уходит в один кусок.
+    size = os.path.getsize(path)
+    if not size:
+        return []
+    chunks = []
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        start = 0
+        while start < size:
+            end = mm.find(b'\n', min(start + chunk_size, size) - 1)
+            end = size if end == -1 else end + 1
+            chunks.append((path, start, end))
+            start = end
+    return chunks
+
+
+def init_worker(patterns, line_kinds):
+    global _patterns, _line_kinds
+    _patterns = compile_patterns(patterns)
+    _line_kinds = frozenset(line_kinds)
+
+
+def file_map(path):
+    # Каждый процесс отображает файл в память один раз; страницы общие с кэшем ОС,
+    # поэтому куски не копируются между процессами
+    mm = _maps.get(path)
+    if mm is None:
+        with open(path, 'rb') as f:
+            mm = _maps[path] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return mm
+
+
+def scan_chunk(task):
+    path, start, end = task
+    data = file_map(path)[start:end]
+    text = data.decode('utf-8', errors='replace')
+    ascii_only = data.isascii()
+
+    matches = []
+    last_lines = {}
+    # Смещения в байтах: для ASCII они совпадают с позициями символов, иначе байты
+    # досчитываются по отрезкам между совпадениями, чтобы не кодировать текст заново целиком
+    position, offset = 0, start
+    for kind, match in find_all(_patterns, text):
+        begin = match.start()
+        if kind in _line_kinds:
+            begin = text.rfind('\n', 0, begin) + 1
+            if last_lines.get(kind) == begin:
+                continue
+            last_lines[kind] = begin
+            line_end = text.find('\n', begin)
+            value = text[begin:line_end if line_end != -1 else len(text)].rstrip('\r')
+        else:
+            value = match.group()
+
+        if ascii_only:
+            offset = start + begin
+        elif begin >= position:
+            offset += len(text[position:begin].encode('utf-8'))
+            position = begin
+        else:
+            offset -= len(text[begin:position].encode('utf-8'))
+            position = begin
+        matches.append((kind, offset, value))
+    return path, matches
+
+
+def iter_matches(paths, processes=None, chunk_size=CHUNK_SIZE, patterns=PATTERNS, line_kinds=LINE_KINDS):
+    # Совпадения выдаются по мере готовности кусков в порядке файлов и смещений;
+    # в памяти держатся только результаты кусков, обогнавших очередь
+    tasks = (chunk for path in paths for chunk in plan_chunks(path, chunk_size))
+    processes = processes or os.cpu_count() or 1
+    if processes == 1:
+        init_worker(patterns, line_kinds)
+        for path, matches in map(scan_chunk, tasks):
+            for kind, offset, value in matches:
+                yield path, kind, offset, value
+        return
+
+    with Pool(processes, initializer=init_worker, initargs=(patterns, line_kinds)) as pool:
+        for path, matches in pool.imap(scan_chunk, tasks):
+            for kind, offset, value in matches:
+                yield path, kind, offset, value
+
+
+def parse_patterns(items):
+    patterns = dict(PATTERNS)
+    for item in items:
+        name, pattern = item.split('=', 1)
+        if not name.isidentifier():
+            raise ValueError(f"Имя выражения должно быть идентификатором: {name}")
+        re.compile(pattern)
+        patterns[name] = pattern
+    return patterns
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Поиск доменов, телефонов и строк по большим файлам за один проход")
+    parser.add_argument('files', nargs='+', help="файлы для поиска")
+    parser.add_argument('-o', '--output', help="файл результатов (по умолчанию стандартный вывод)")
+    parser.add_argument('-j', '--processes', type=int, help="число процессов (по умолчанию по числу ядер)")
+    parser.add_argument('--chunk-mb', type=float, default=CHUNK_SIZE / 2 ** 20,
+                        help="размер куска в МБ (по умолчанию 4)")
+    parser.add_argument('--kinds', help="выводить только эти виды, например domain,phone")
+    parser.add_argument('--pattern', action='append', default=[],
+                        help="дополнительное выражение ИМЯ=REGEX, можно указать несколько раз")
+    args = parser.parse_args(argv)
+
+    patterns = parse_patterns(args.pattern)
+    kinds = set(args.kinds.split(',')) if args.kinds else None
+    if kinds:
+        patterns = {name: pattern for name, pattern in patterns.items() if name in kinds}
+
+    out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    try:
+        matches = iter_matches(args.files, args.processes, int(args.chunk_mb * 2 ** 20), patterns, LINE_KINDS)
+        for path, kind, offset, value in matches:
+            out.write(f"{path}:{offset}\t{kind}\t{value}\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,22 +1,19 @@
-import re
+from scanner import iter_matches
 
-# Чтение исходных данных из txt
-with open('test_data.txt', 'r', encoding='utf-8') as file:
-    text = file.read()
+# Один проход по файлу сразу по всем выражениям (см. scanner.py); файл не читается в память целиком
+results = {'domain': [], 'phone': [], 'png_line': []}
+for path, kind, offset, value in iter_matches(['test_data.txt'], processes=1):
+    if kind != 'png_line' or not results['png_line']: # Нужна только первая строка с 16.png
+        results[kind].append(value)
 
 print('-----------------Домены-----------------') # Разделение вывода
-domains = re.findall(r'\b\w+\.(?:com|ru)\b', text) # Поиск доменов с .ru и .com
-for domain in domains:
+for domain in results['domain']: # Домены с .ru и .com
     print(domain)
 
 print('-----------------Телефоны-----------------') # Разделение вывода
-phones = re.findall(r'\b[78]9?916\d{7}\b', text)
-for phone in phones:
+for phone in results['phone']:
     print(phone)
 
 print('-----------------Поиск-содержания-----------------') # Разделение вывода
-lines = text.split('\n')
-for line in lines:
-    if '16.png' in line:
-        print(line)
-        break
\ No newline at end of file
+for line in results['png_line']:
+    print(line)
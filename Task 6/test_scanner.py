@@ -0,0 +1,73 @@
+import os
+import random
+import re
+import tempfile
+import unittest
+
+from scanner import PATTERNS, iter_matches
+
+
+def baseline_search(text):
+    # Прежние отдельные поиски task6.py по всему тексту, без объединения выражений
+    return {
+        'domain': re.findall(r'\b\w+\.(?:com|ru)\b', text),
+        'phone': re.findall(r'\b[78]9?916\d{7}\b', text),
+        'png_line': [line for line in text.split('\n') if '16.png' in line],
+    }
+
+
+# Куски, в которых совпадения разных видов пересекаются или стоят вплотную
+OVERLAPPING = [
+    '79161234567.com', '89916123456.ru', 'cdn16.png.ru', 'img16.png.com', '16.png',
+    'a.ru.com', 'ya.ru', 'site.com', '79161234567', 'домен.ru', 'тел79161234567',
+    'x16.png79161234567.com', '', ' ', '\t', ',', ';', 'ё', '🙂',
+]
+
+
+def random_text(rng, lines=200):
+    return '\n'.join(''.join(rng.choice(OVERLAPPING) + rng.choice(['', ' ', ''])
+                             for _ in range(rng.randint(0, 8)))
+                     for _ in range(lines))
+
+
+class ScannerTest(unittest.TestCase):
+    def scan(self, text, chunk_size):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'data.txt')
+            with open(path, 'w', encoding='utf-8', newline='') as f:
+                f.write(text)
+            with open(path, 'rb') as f:
+                data = f.read()
+            results = {kind: [] for kind in PATTERNS}
+            for _, kind, offset, value in iter_matches([path], processes=1, chunk_size=chunk_size):
+                # Смещение указывает на начало значения в байтах файла
+                encoded = value.encode('utf-8')
+                self.assertEqual(data[offset:offset + len(encoded)], encoded)
+                results[kind].append(value)
+        return results
+
+    def assert_same(self, text, chunk_size=64):
+        self.assertEqual(self.scan(text, chunk_size), baseline_search(text), repr(text))
+
+    def test_overlapping_kinds(self):
+        self.assert_same('79161234567.com\n')
+        self.assert_same('cdn16.png.ru\n')
+        self.assert_same('x16.png79161234567.com and 89916123456.ru\ncdn16.png.ru 16.png\n')
+
+    def test_line_reported_once(self):
+        self.assert_same('16.png 16.png cdn16.png.ru\nnothing\n16.png\n')
+
+    def test_random_texts(self):
+        rng = random.Random(20261018)
+        for _ in range(200):
+            text = random_text(rng, rng.randint(0, 30))
+            self.assert_same(text, chunk_size=rng.choice([1, 16, 64, 4096]))
+
+    def test_test_data(self):
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test_data.txt')
+        with open(path, encoding='utf-8', newline='') as f:
+            self.assert_same(f.read(), chunk_size=1024)
+
+
+if __name__ == '__main__':
+    unittest.main()
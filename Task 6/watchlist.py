@@ -0,0 +1,257 @@
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import sys
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter, deque
+
+from scanner import iter_matches
+
+# Меняется при изменении структуры индекса, чтобы старый кэш не подхватывался
+INDEX_VERSION = 1
+DEFAULT_CACHE_DIR = '.watchlist_cache'
+
+WATCHLIST_KINDS = ('domains', 'phones', 'substrings', 'suffixes')
+
+
+def normalize_domain(domain):
+    return domain.strip().lower().rstrip('.')
+
+
+def normalize_phone(phone):
+    digits = ''.join(ch for ch in phone if ch.isdigit())
+    # 8 и 7 в начале российского номера - один и тот же номер
+    if len(digits) == 11 and digits[0] == '8':
+        digits = '7' + digits[1:]
+    return digits
+
+
+def domain_hash(domain):
+    # 64-битный хэш вместо строки: 8 байт на домен в отсортированном массиве; встроенный
+    # hash() не подходит, потому что для строк он свой в каждом процессе
+    return int.from_bytes(hashlib.blake2b(domain.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def sorted_array(values):
+    return array('Q', sorted(set(values)))
+
+
+def contains(sorted_values, value):
+    i = bisect_left(sorted_values, value)
+    return i < len(sorted_values) and sorted_values[i] == value
+
+
+class AhoCorasick:
+    # Автомат по всем подстрокам сразу: переходы - словари по символам, ссылки неудач и
+    # выходы - по номерам узлов. Текст проходится один раз независимо от числа подстрок.
+    def __init__(self, patterns):
+        self.goto = [{}]
+        self.fail = array('i', [0])
+        self.outputs = [()]
+        self.lengths = array('i')
+
+        for pattern_id, pattern in enumerate(patterns):
+            node = 0
+            for ch in pattern:
+                child = self.goto[node].get(ch)
+                if child is None:
+                    child = self.goto[node][ch] = len(self.goto)
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.outputs.append(())
+                node = child
+            self.outputs[node] += (pattern_id,)
+            self.lengths.append(len(pattern))
+
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self.goto[node].items():
+                queue.append(child)
+                state = self.fail[node]
+                while state and ch not in self.goto[state]:
+                    state = self.fail[state]
+                fallback = self.goto[state].get(ch, 0)
+                self.fail[child] = fallback if fallback != child else 0
+                self.outputs[child] += self.outputs[self.fail[child]]
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def iter_matches(self, text):
+        # (позиция начала, номер подстроки) для всех вхождений, в том числе пересекающихся
+        goto, fail, outputs, lengths = self.goto, self.fail, self.outputs, self.lengths
+        node = 0
+        for end, ch in enumerate(text, 1):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for pattern_id in outputs[node]:
+                yield end - lengths[pattern_id], pattern_id
+
+
+class WatchlistIndex:
+    # Точные домены - отсортированный массив 64-битных хэшей, телефоны - отсортированный
+    # массив чисел, поиск в обоих - двоичный. Подстроки и суффиксы доменов - один автомат
+    # Ахо-Корасик; суффикс засчитывается, только если вхождение стоит в конце домена
+    # после точки или занимает его целиком (mail.ru подходит к mycloud.mail.ru, но не к gmail.ru).
+    def __init__(self, domains=(), phones=(), substrings=(), suffixes=()):
+        self.domains = sorted_array(domain_hash(normalize_domain(domain)) for domain in domains)
+        self.phones = sorted_array(int(phone) for phone in map(normalize_phone, phones) if phone)
+        substrings = sorted({normalize_domain(item) for item in substrings} - {''})
+        suffixes = sorted({normalize_domain(item).lstrip('.') for item in suffixes} - {''})
+        # Сначала подстроки, потом суффиксы: вид определяется по номеру в self.patterns
+        self.patterns = substrings + suffixes
+        self.substring_count = len(substrings)
+        self.automaton = AhoCorasick(self.patterns)
+
+    def stats(self):
+        return {
+            'domains': len(self.domains),
+            'phones': len(self.phones),
+            'substrings': self.substring_count,
+            'suffixes': len(self.patterns) - self.substring_count,
+            'automaton_nodes': len(self.automaton.goto),
+        }
+
+    def match_domain(self, domain):
+        # Список (вид, индикатор) для домена
+        domain = normalize_domain(domain)
+        hits = []
+        if contains(self.domains, domain_hash(domain)):
+            hits.append(('domain', domain))
+        seen = set()
+        for start, pattern_id in self.automaton.iter_matches(domain):
+            if pattern_id in seen:
+                continue
+            pattern = self.patterns[pattern_id]
+            if pattern_id < self.substring_count:
+                seen.add(pattern_id)
+                hits.append(('substring', pattern))
+            elif start + len(pattern) == len(domain) and (start == 0 or domain[start - 1] == '.'):
+                seen.add(pattern_id)
+                hits.append(('suffix', pattern))
+        return hits
+
+    def match_phone(self, phone):
+        phone = normalize_phone(phone)
+        if phone and contains(self.phones, int(phone)):
+            return [('phone', phone)]
+        return []
+
+    def match(self, kind, value):
+        if kind == 'domain':
+            return self.match_domain(value)
+        if kind == 'phone':
+            return self.match_phone(value)
+        return []
+
+
+def read_watchlist(path):
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                yield line
+
+
+def cache_key(paths):
+    # Ключ кэша - версия индекса и путь, размер и время изменения каждого списка
+    parts = [str(INDEX_VERSION)]
+    for kind in WATCHLIST_KINDS:
+        for path in paths.get(kind, ()):
+            stat = os.stat(path)
+            parts.append(f"{kind}\t{os.path.abspath(path)}\t{stat.st_size}\t{stat.st_mtime_ns}")
+    return hashlib.sha1("\n".join(parts).encode('utf-8')).hexdigest()
+
+
+def build_index(paths):
+    lists = {kind: (line for path in paths.get(kind, ()) for line in read_watchlist(path)) for kind in WATCHLIST_KINDS}
+    return WatchlistIndex(**lists)
+
+
+def load_index(paths, cache_dir=DEFAULT_CACHE_DIR):
+    # Разбор списков в десятки МБ занимает секунды, а готовый индекс из pickle читается
+    # за доли секунды: массивы сохраняются как сплошные байты
+    if not cache_dir:
+        return build_index(paths), False
+
+    cache_path = os.path.join(cache_dir, f"watchlist-{cache_key(paths)}.pickle")
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path, 'rb') as f:
+                return pickle.load(f), True
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+            pass
+
+    index = build_index(paths)
+    os.makedirs(cache_dir, exist_ok=True)
+    temporary = cache_path + '.tmp'
+    with open(temporary, 'wb') as f:
+        pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary, cache_path)
+    return index, False
+
+
+def count_hits(matches, index):
+    # Каждое уникальное значение проверяется по индексу один раз; попадания суммируются
+    # по индикаторам: сколько раз встретились и сколько разных значений к ним привели
+    occurrences = Counter((kind, value) for _, kind, _, value in matches if kind in ('domain', 'phone'))
+    hits = {}
+    for (kind, value), count in occurrences.items():
+        for match_kind, indicator in index.match(kind, value):
+            entry = hits.get((match_kind, indicator))
+            if entry is None:
+                entry = hits[(match_kind, indicator)] = {'kind': match_kind, 'indicator': indicator,
+                                                         'hits': 0, 'values': 0}
+            entry['hits'] += count
+            entry['values'] += 1
+    return sorted(hits.values(), key=lambda entry: (-entry['hits'], entry['kind'], entry['indicator'])), occurrences
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Проверка найденных доменов и телефонов по спискам индикаторов")
+    parser.add_argument('files', nargs='+', help="файлы для поиска")
+    parser.add_argument('--domains', action='append', default=[], help="список точных доменов, по одному в строке")
+    parser.add_argument('--phones', action='append', default=[], help="список телефонов")
+    parser.add_argument('--substrings', action='append', default=[], help="список подстрок для доменов")
+    parser.add_argument('--suffixes', action='append', default=[],
+                        help="список суффиксов доменов (mail.ru подходит к любому поддомену mail.ru)")
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR,
+                        help="каталог кэша индекса (по умолчанию .watchlist_cache, пустая строка - без кэша)")
+    parser.add_argument('-j', '--processes', type=int, help="число процессов сканера")
+    parser.add_argument('--json', action='store_true', help="вывести попадания в JSON")
+    args = parser.parse_args(argv)
+
+    paths = {kind: getattr(args, kind) for kind in WATCHLIST_KINDS}
+    started = time.perf_counter()
+    index, cached = load_index(paths, args.cache_dir)
+    load_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    hits, occurrences = count_hits(iter_matches(args.files, args.processes), index)
+    match_seconds = time.perf_counter() - started
+
+    if args.json:
+        json.dump({'index': index.stats(), 'hits': hits}, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+        return 0
+
+    stats = index.stats()
+    print(f"Индекс {'из кэша' if cached else 'построен'} за {load_seconds:.3f} с: доменов {stats['domains']}, "
+          f"телефонов {stats['phones']}, подстрок {stats['substrings']}, суффиксов {stats['suffixes']}")
+    print(f"Проверено {sum(occurrences.values())} совпадений ({len(occurrences)} уникальных) "
+          f"за {match_seconds:.3f} с, сработало индикаторов: {len(hits)}")
+    if hits:
+        print(f"{'Вид':<11}{'Попаданий':>10}{'Значений':>10}  Индикатор")
+        for entry in hits:
+            print(f"{entry['kind']:<11}{entry['hits']:>10}{entry['values']:>10}  {entry['indicator']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())